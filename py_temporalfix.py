@@ -1,40 +1,435 @@
 from argparse import Namespace
 from copy import deepcopy
 import logging
-import numpy as np
 import os
 from pprint import pformat, pprint
+import shutil
 import signal
 import subprocess
 import sys
+import time
 
 from utils.arg_parse import arg_parse
+from utils.balance import BalanceController, BalanceDecision, RelayStats
+from utils.cpu import (
+    available_cpus,
+    CpuPartition,
+    filter_share,
+    partition_cpus,
+    set_process_affinity,
+)
 from utils.encoder import (
     arguments_to_encoder_params,
     generate_ffmpeg_encoder_cmd,
+    generate_ffmpeg_intermediate_cmd,
+    generate_ffmpeg_mux_cmd,
     VideoEncoderParams,
 )
 from utils.logger import logger
 from utils.media import (
     MediaInfo,
+    VideoCodec,
     VideoInfo,
     extract_media_info,
     get_media_info,
 )
 from utils.path_utils import (
     absolute_path,
+    get_app_tempdir,
     is_access_granted,
     os_path_basename,
     path_split,
 )
-from utils.pxl_fmt import PIXEL_FORMAT
+from utils.pxl_fmt import get_pipe_pix_fmt, PIXEL_FORMAT
 from utils.p_print import *
 from utils.time_conversions import frame_rate_to_str
 from utils.tools import check_missing_tools
-from utils.vsscript import extract_info_from_vs_script
+from utils.two_stage import (
+    encode_chunks,
+    intermediate_filepath,
+    split_chunks,
+    write_concat_list,
+)
+from utils.vsscript import parse_script_info, print_script_info
+from utils.worker_pool import vs_command_to_args, Worker, WorkerPool
+
+
+def start_processes(
+    vs_command: list[str],
+    vs_env: dict[str, str],
+    encoder_command: list[str],
+    cpu_partition: CpuPartition,
+    pool: WorkerPool | None = None,
+) -> tuple[subprocess.Popen | Worker, subprocess.Popen]:
+    """Starts the encoder then the vs script, returns both processes.
+    pool: the vs script is run by a warm worker instead of vspipe
+    """
+    # Encoder process
+    encoder_subprocess: subprocess.Popen | None = None
+    try:
+        encoder_subprocess = subprocess.Popen(
+            encoder_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+    except Exception as e:
+        sys.exit(red(f"[E] Unexpected error: {type(e)}"))
+    if encoder_subprocess is None:
+        sys.exit(red(f"[E] Encoder process is not started"))
+    if not set_process_affinity(encoder_subprocess, cpu_partition.encoder_cpus):
+        logger.debug("Failed to set the CPU affinity of the encoder")
+
+    # Vs process
+    vs_subprocess: subprocess.Popen | Worker | None = None
+    if pool is not None:
+        try:
+            vs_subprocess = pool.start(vs_command_to_args(vs_command))
+        except RuntimeError as e:
+            encoder_subprocess.kill()
+            sys.exit(red(f"Error while evaluating script: {e}"))
+        affinity_set: bool = set_process_affinity(vs_subprocess.process, cpu_partition.filter_cpus)
+    else:
+        try:
+            vs_subprocess = subprocess.Popen(
+                vs_command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=vs_env,
+            )
+        except Exception as e:
+            print(f"[E] Unexpected error: {type(e)}", flush=True)
+        affinity_set = set_process_affinity(vs_subprocess, cpu_partition.filter_cpus)
+    if not affinity_set:
+        logger.debug("Failed to set the CPU affinity of the vs script")
+
+    os.set_blocking(encoder_subprocess.stdout.fileno(), False)
+    os.set_blocking(vs_subprocess.stderr.fileno(), False)
+    return vs_subprocess, encoder_subprocess
+
+
+
+def relay_frames(
+    vs_subprocess: subprocess.Popen | Worker,
+    encoder_subprocess: subprocess.Popen,
+    frame_count: int,
+    frame_nbytes: int,
+    stats: RelayStats | None = None,
+    window: float = 0,
+    warmup: int = 10,
+    verbose: bool = False,
+) -> int:
+    """Relays the frames from the vs script to the encoder.
+    stats: time spent waiting for each process, measured after the
+    warmup frames (source indexing, pipeline fill) during window seconds.
+    verbose: print the script info reported by the vs script.
+    Returns the nb of relayed frames.
+    """
+    frame: bytes = None
+    line: str = ''
+    relayed: int = 0
+    start_time: float = 0.
+    try:
+        for i in range(frame_count):
+            # print(f"reading frame no. {i}", end="\r")
+            read_start: float = time.perf_counter()
+            frame: bytes = vs_subprocess.stdout.read(frame_nbytes)
+            if not frame or len(frame) < frame_nbytes:
+                # The script failed or has less frames than expected
+                print()
+                vs_stderr: bytes | None = vs_subprocess.stderr.read()
+                if vs_stderr:
+                    print(red(f"Error while evaluating script:\n{vs_stderr.decode('utf-8')}"))
+                logger.debug(f"vs script stopped after {relayed} frames")
+                return relayed
+            write_start: float = time.perf_counter()
+            encoder_subprocess.stdin.write(frame)
+            write_end: float = time.perf_counter()
+            relayed += 1
+            line = encoder_subprocess.stdout.readline().decode('utf-8')
+            if line:
+                print(line.strip(), end='\r', file=sys.stderr)
+            line = vs_subprocess.stderr.readline().decode('utf-8')
+            if (script_info := parse_script_info(line)) is not None:
+                print_script_info(script_info, verbose)
+            elif line:
+                print(line.strip(), end='\r', file=sys.stderr)
+
+            if stats is not None and i >= warmup:
+                if stats.frames == 0:
+                    start_time = read_start
+                stats.frames += 1
+                stats.read_time += write_start - read_start
+                stats.write_time += write_end - write_start
+                stats.elapsed = write_end - start_time
+                if stats.elapsed >= window:
+                    return relayed
+        print()
+    except:
+        pass
+    return relayed
+
+
+
+def encode_two_stage(
+    arguments: Namespace,
+    vs_command: list[str],
+    vs_threads_index: int,
+    vs_env: dict[str, str],
+    vs_video_info: VideoInfo,
+    e_params: VideoEncoderParams,
+    in_media_info: MediaInfo,
+    exclude_fp: str,
+    out_media_path: str,
+    pool: WorkerPool | None = None,
+) -> bool:
+    """Stage 1: the vs script output is saved once to a lossless intermediate
+    file, which is reused by the next runs with the same filter arguments.
+    Stage 2: parallel encoders over chunks of the intermediate file, then
+    the chunks are concatenated and the audio/subtitles tracks are copied.
+    """
+    in_video_info: VideoInfo = in_media_info['video']
+    frame_count: int = in_video_info['frame_count']
+    h, w = in_video_info['shape'][:2]
+    in_nbytes: int = h * w * vs_video_info['bpp'] // 8
+
+    vs_args: list[str] = [
+        arg for arg in vs_command[2:]
+        if not arg.startswith(("threads=", "decoder_threads="))
+    ]
+    intermediate_dir: str = absolute_path(arguments.intermediate_dir)
+    intermediate_fp: str = intermediate_filepath(
+        in_video_info['filepath'], vs_args, exclude_fp, intermediate_dir
+    )
+    print(lightcyan("Intermediate file:"), intermediate_fp)
+    logger.debug(f"Intermediate file: {intermediate_fp}")
+
+    # Stage 1
+    if os.path.isfile(intermediate_fp):
+        print(lightcyan("Stage 1:"), "reuse the intermediate file")
+    else:
+        os.makedirs(os.path.dirname(intermediate_fp), exist_ok=True)
+        cpu_partition: CpuPartition = partition_cpus(
+            vcodec=VideoCodec.FFV1,
+            preset=None,
+            affinity=arguments.affinity,
+            numa_node=arguments.numa_node,
+        )
+        vs_command = vs_command.copy()
+        vs_command[vs_threads_index] = f"threads={cpu_partition.filter_threads}"
+        tmp_fp: str = f"{intermediate_fp}.tmp"
+        intermediate_command: list[str] = generate_ffmpeg_intermediate_cmd(
+            video_info=vs_video_info,
+            filepath=tmp_fp,
+            threads=cpu_partition.encoder_threads,
+        )
+        logger.debug(f"Intermediate command: {' '.join(intermediate_command)}")
+        vs_subprocess, encoder_subprocess = start_processes(
+            vs_command=vs_command,
+            vs_env=vs_env,
+            encoder_command=intermediate_command,
+            cpu_partition=cpu_partition,
+            pool=pool,
+        )
+        print(lightcyan("Stage 1:"), "filtering")
+        relayed: int = relay_frames(
+            vs_subprocess,
+            encoder_subprocess,
+            frame_count=frame_count,
+            frame_nbytes=in_nbytes,
+            verbose=arguments.log or arguments.debug,
+        )
+        if pool is not None:
+            pool.release(vs_subprocess, relayed)
+        try:
+            stdout_b, _ = encoder_subprocess.communicate(timeout=60)
+        except:
+            encoder_subprocess.kill()
+            return False
+        if stdout_b:
+            logger.debug(f"FFmpeg stdout:\n{stdout_b.decode('utf-8')}")
+        if encoder_subprocess.returncode != 0 or relayed != frame_count:
+            print(red(f"Error: failed to generate the intermediate file"))
+            if os.path.isfile(tmp_fp):
+                os.remove(tmp_fp)
+            return False
+        os.replace(tmp_fp, intermediate_fp)
+
+    # Stage 2
+    cpu_count: int = len(available_cpus())
+    jobs: int = arguments.encoders if arguments.encoders > 0 else max(cpu_count // 8, 1)
+    chunks: list[tuple[int, int]] = split_chunks(frame_count, jobs)
+    jobs = min(jobs, len(chunks))
+    e_params.threads = max(cpu_count // jobs, 1)
+    chunk_dir: str = os.path.join(
+        get_app_tempdir(), "chunks", f"{os_path_basename(e_params.filepath)}_{os.getpid()}"
+    )
+    print(
+        lightcyan("Stage 2:"),
+        f"{len(chunks)} chunks, {jobs} encoders, {e_params.threads} threads each"
+    )
+    chunk_fps: list[str] | None = encode_chunks(
+        intermediate_fp=intermediate_fp,
+        chunks=chunks,
+        video_info=vs_video_info,
+        params=e_params,
+        in_media_info=in_media_info,
+        jobs=jobs,
+        chunk_dir=chunk_dir,
+    )
+
+    success: bool = chunk_fps is not None
+    if success:
+        list_fp: str = os.path.join(chunk_dir, "chunks.txt")
+        write_concat_list(chunk_fps, list_fp)
+        success = mux_tracks(
+            video_fp=list_fp,
+            out_media_path=out_media_path,
+            e_params=e_params,
+            vs_video_info=vs_video_info,
+            in_media_info=in_media_info,
+            concat=True,
+        )
+        if not success:
+            # The encoded chunks are kept so that they can be muxed again
+            print(red(f"The encoded chunks are kept in {chunk_dir}, concat list: {list_fp}"))
+            return False
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+    return success
+
+
+
+def mux_tracks(
+    video_fp: str,
+    out_media_path: str,
+    e_params: VideoEncoderParams,
+    vs_video_info: VideoInfo,
+    in_media_info: MediaInfo,
+    concat: bool = False,
+) -> bool:
+    """Mux stage: copies the encoded video, the audio/subtitles tracks,
+    the chapters and the metadata to the output file. No re-encoding.
+    """
+    mux_command: list[str] = generate_ffmpeg_mux_cmd(
+        video_fp=video_fp,
+        out_fp=out_media_path,
+        params=e_params,
+        video_info=vs_video_info,
+        in_media_info=in_media_info,
+        concat=concat,
+    )
+    logger.debug(f"Mux command: {' '.join(mux_command)}")
+    process = subprocess.run(mux_command, capture_output=True)
+    if process.stderr:
+        logger.debug(f"FFmpeg mux stderr:\n{process.stderr.decode('utf-8')}")
+    if process.returncode != 0:
+        print(red(f"Error: failed to mux {out_media_path}"))
+        return False
+    return True
+
+
+
+def check_output(
+    out_media_path: str,
+    in_video_info: VideoInfo,
+    arguments: Namespace,
+) -> bool:
+    """Verifies the output file, returns False if it is not valid"""
+    # For evaluation purpose
+    # Enable this after validation
+    success: bool = True
+    if arguments.debug:
+        out_vi: VideoInfo = None
+        try:
+            out_vi: VideoInfo = extract_media_info(out_media_path)['video']
+        except:
+            success = False
+
+        if out_vi is None or out_vi['frame_count'] != in_video_info['frame_count']:
+            logger.debug(f"Number of frames differs")
+            success = False
+
+        if success and arguments.log:
+            frame_count_str: str = f"    {out_vi['frame_count']} frames"
+            h, w = out_vi['shape'][:2]
+            dim_str: str = f", {w}x{h}"
+            frame_rate_str: str = f", {frame_rate_to_str(out_vi['frame_rate_r'])} fps"
+            pix_fmt_str: str = f", {out_vi['pix_fmt']}"
+            _sar: tuple[int] = out_vi['sar']
+            sar_str: str = f", SAR {':'.join(map(str, _sar))}" if _sar[0] / _sar[1] != 1 else ""
+            _dar: tuple[int] = out_vi['dar']
+            dar_str: str = f", DAR {':'.join(map(str, _dar))}" if _dar[0] / _dar[1] != 1 else ""
+            out_vi_str: str = "".join((frame_count_str, dim_str, frame_rate_str, pix_fmt_str, sar_str, dar_str))
+            logger.debug(f"output video format: {out_vi_str}")
+
+    if not os.path.isfile(out_media_path) or not success:
+        print(red(f"Error: failed to generate {out_media_path}"))
+        return False
+    return True
+
+
+
+def vs_environment(root_dir: str) -> dict[str, str]:
+    """Returns the environment of the vs processes"""
+    # Clean environment for vspython
+    # vs_path: list[str] = []
+    forbidden_names: tuple[str] = (
+        'python',
+        'conda',
+        'vapoursynth',
+        'ffmpeg',
+    )
+
+    # Create path used by vs subprocess
+    vs_path: list[str] = []
+    sep: str = ";"
+    if sys.platform == "win32":
+        for dir in ("Scripts", "vs-scripts", "vs-plugins", ""):
+            vs_path.insert(0, os.path.abspath(
+                os.path.join(root_dir, "external", "vspython", dir)
+            ))
+
+    elif sys.platform == "linux":
+        for dir in (
+            "/usr/lib/x86_64-linux-gnu/vapoursynth",
+            "/usr/lib/bin"
+        ):
+            vs_path.insert(0, dir)
+        sep = ':'
+
+    vs_path.insert(0, root_dir)
+
+    # Clean environnment for vs
+    vs_env = os.environ.copy()
+    if sys.platform == 'win32':
+        del vs_env['PATH']
+        for k, v in vs_env.copy().items():
+            k_lower, v_lower = k.lower(), v.lower()
+            for n in forbidden_names:
+                if n in k_lower:
+                    try:
+                        del vs_env[k]
+                        logger.debug(f"removing: {k}: {v}")
+                    except:
+                        pass
+
+                if n in v_lower:
+                    try:
+                        del vs_env[k]
+                        logger.debug(f"removing: {k}: {v}")
+                    except:
+                        pass
+        vs_env['PATH'] = sep.join(vs_path)
+
+    return vs_env
+
 
 
 def main():
+    # Parse arguments first: --help does not need the external tools
+    arguments: Namespace = arg_parse()
+
     # Verify the installation
     root_dir: str = os.path.dirname(os.path.abspath(__file__))
     vspipe_exe: str = absolute_path(
@@ -52,11 +447,60 @@ Error: missing tools: {', '.join(missing_tools)}.
 Please install these dependencies (refer to the documentation).
         """))
 
-    # Parse arguments
-    arguments: Namespace = arg_parse()
+    if len(arguments.input) > 1 and arguments.output:
+        sys.exit(red("Error: --output is not supported with several input files"))
+
+    vs_env: dict[str, str] = vs_environment(root_dir)
+
+    # Warm workers: the vs core is initialized once for all the input files
+    pool: WorkerPool | None = None
+    if arguments.warm_workers > 0:
+        vspython_exe: str = absolute_path(
+            os.path.join(root_dir, "external", "vspython", "python.exe")
+        )
+        if sys.platform == "linux":
+            vspython_exe = sys.executable
+        worker_command: list[str] = [vspython_exe, os.path.join(root_dir, "vstf_worker.py")]
+        if arguments.worker_memory > 0:
+            worker_command.extend(["--max_memory", str(arguments.worker_memory)])
+        pool = WorkerPool(
+            command=worker_command,
+            env=vs_env,
+            cwd=root_dir,
+            size=arguments.warm_workers,
+            max_jobs=arguments.worker_jobs,
+        )
 
+    try:
+        for input_fp in arguments.input:
+            process_video(
+                arguments=arguments,
+                input_fp=input_fp,
+                root_dir=root_dir,
+                vspipe_exe=vspipe_exe,
+                vs_env=vs_env,
+                pool=pool,
+            )
+            # A log file per input file
+            for handler in logger.handlers.copy():
+                logger.removeHandler(handler)
+                handler.close()
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+
+def process_video(
+    arguments: Namespace,
+    input_fp: str,
+    root_dir: str,
+    vspipe_exe: str,
+    vs_env: dict[str, str],
+    pool: WorkerPool | None = None,
+) -> None:
     # Check arguments validity
-    in_media_path: str = absolute_path(arguments.input)
+    in_media_path: str = absolute_path(input_fp)
     if not os.path.isfile(in_media_path):
         sys.exit(red(f"Error: missing input file {in_media_path}"))
 
@@ -104,23 +548,26 @@ Please install these dependencies (refer to the documentation).
     logger.debug(f"input: {in_media_path}")
 
     # Open media file
-    in_media_path: str = absolute_path(arguments.input)
+    in_media_path: str = absolute_path(input_fp)
     in_media_info: MediaInfo | None = None
     try:
         in_media_info = extract_media_info(in_media_path)
     except:
         sys.exit(f"[E] {in_media_path} is not a valid input media file")
+    ffprobe_info: dict = get_media_info(in_media_path)
     if debug:
         print(lightcyan("FFmpeg media info:"))
-        pprint(get_media_info(in_media_path))
+        pprint(ffprobe_info)
         print(lightcyan("Input media info:"))
         pprint(in_media_info)
-    logger.debug(f"FFmpeg media info:\n{pformat(get_media_info(in_media_path))}")
+    logger.debug(f"FFmpeg media info:\n{pformat(ffprobe_info)}")
     logger.debug(f"Input media info:\n{pformat(in_media_info)}")
     in_video_info: VideoInfo = in_media_info['video']
     in_video_info['filepath'] = in_media_path
 
     frame_count_str: str = f"    {in_video_info['frame_count']} frames"
+    if not in_video_info['frame_count_exact']:
+        frame_count_str += " (estimated)"
     h, w = in_video_info['shape'][:2]
     dim_str: str = f", {w}x{h}"
     frame_rate_str: str = f", {frame_rate_to_str(in_video_info['frame_rate_r'])} fps"
@@ -148,18 +595,24 @@ Please install these dependencies (refer to the documentation).
     out_media_path = e_params.filepath
     print(lightcyan(f"Output video file:"), f"{out_media_path}")
     logger.debug(f"output: {out_media_path}")
+    # The encoder output is the video stream only, the mux stage adds the
+    # audio/subtitles tracks
+    out_dirname, out_basename, out_extension = path_split(out_media_path)
+    video_fp: str = os.path.join(out_dirname, f"{out_basename}.video{out_extension}")
+    e_params.filepath = video_fp
     if debug:
         print(lightcyan("Encoder params:"))
         pprint(e_params)
 
 
     # Script output
-    vs_out_pix_fmt: str = 'yuv420p'
-    if e_params.pix_fmt != 'yuv420p':
-        vs_out_pix_fmt = 'yuv444p16le'
-    vs_c_order = 'yuv'
+    try:
+        vs_out_pix_fmt: str = get_pipe_pix_fmt(e_params.pix_fmt)
+    except ValueError:
+        sys.exit(red(f"Error: pixel format \"{e_params.pix_fmt}\" is not supported"))
+    vs_c_order = PIXEL_FORMAT[vs_out_pix_fmt]['c_order']
     vs_video_info.update({
-        'dtype': np.uint16 if '16' in vs_out_pix_fmt else np.uint8,
+        'dtype': 'uint16' if PIXEL_FORMAT[vs_out_pix_fmt]['bpp'] > 8 else 'uint8',
         'bpp': PIXEL_FORMAT[vs_out_pix_fmt]['pipe_bpp'],
         'c_order': vs_c_order,
         'pix_fmt': vs_out_pix_fmt,
@@ -173,16 +626,68 @@ Please install these dependencies (refer to the documentation).
         pprint(vs_video_info)
     logger.debug(f"VS video info:\n{pformat(vs_video_info)}")
 
+    # Split the CPUs between the vs script and the encoder
+    cpu_share: float = arguments.cpu_split
+    if cpu_share <= 0:
+        cpu_share = filter_share(e_params.vcodec, e_params.preset, arguments.encoder_cost)
+    cpu_partition: CpuPartition = partition_cpus(
+        vcodec=e_params.vcodec,
+        preset=e_params.preset,
+        share=cpu_share,
+        affinity=arguments.affinity,
+        numa_node=arguments.numa_node,
+    )
+    e_params.threads = cpu_partition.encoder_threads
+    if debug:
+        print(lightcyan("CPU partition:"))
+        pprint(cpu_partition)
+    logger.debug(f"CPU partition:\n{pformat(cpu_partition)}")
+
+    # Frames excluded from the temporal fix
+    exclude_fp: str = ""
+    if arguments.exclude_file:
+        exclude_fp = absolute_path(arguments.exclude_file)
+        if not os.path.isfile(exclude_fp):
+            sys.exit(red(f"Error: missing exclusion file: {exclude_fp}"))
+
+    # Color range from the container: the script does not need to read a frame.
+    # Left to the frame props for rgb sources
+    color_range: str = ""
+    in_color_range: str | None = in_video_info.get('color_range', None)
+    if (
+        in_color_range is not None
+        and not (in_video_info['pix_fmt'] or "").startswith(('gbr', 'rgb', 'bgr'))
+    ):
+        color_range = {
+            'tv': 'limited', 'mpeg': 'limited', 'limited': 'limited',
+            'pc': 'full', 'jpeg': 'full', 'full': 'full',
+            'unknown': "", 'unspecified': "",
+        }.get(in_color_range.lower(), "")
+
     # VSpipe command
     vs_command: list[str] = [
         vspipe_exe,
         os.path.join(root_dir, "vstf.vpy"),
-        "--arg", f"input_fp=\"{arguments.input}\"",
+        "--arg", f"input_fp=\"{in_media_path}\"",
+        "--arg", f"threads={cpu_partition.filter_threads}",
+        "--arg", f"source_filter={arguments.source_filter}",
+        "--arg", f"decoder_threads={arguments.decoder_threads}",
         "--arg", f"tr={arguments.t_radius}",
         "--arg", f"strength={arguments.strength}",
+        "--arg", f"tf_preset={arguments.tf_preset}",
+        "--arg", f"use_mvsf={int(not arguments.fast_tr)}",
+        "--arg", f"me_downscale={arguments.me_downscale}",
+        "--arg", f"reuse_vectors={int(arguments.reuse_vectors)}",
         "--arg", f"pix_fmt={vs_out_pix_fmt}",
+        "--arg", f"exclude={arguments.exclude}",
+        "--arg", f"exclude_fp={exclude_fp}",
+        "--arg", f"dedup={int(arguments.dedup)}",
+        "--arg", f"autocrop={int(arguments.autocrop)}",
+        "--arg", f"static={int(arguments.static)}",
+        "--arg", f"color_range={color_range}",
         "-",
     ]
+    vs_threads_index: int = vs_command.index(f"threads={cpu_partition.filter_threads}")
     if debug:
         print(lightcyan("VS command:"))
         print(lightgreen(' '.join(vs_command)))
@@ -196,94 +701,13 @@ Please install these dependencies (refer to the documentation).
         params=e_params,
         in_media_info=in_media_info,
     )
-
-    # Encoder process
-    encoder_subprocess: subprocess.Popen | None = None
-    try:
-        encoder_subprocess = subprocess.Popen(
-            encoder_command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        )
-    except Exception as e:
-        sys.exit(red(f"[E] Unexpected error: {type(e)}"))
-    if encoder_subprocess is None:
-        sys.exit(red(f"[E] Encoder process is not started"))
-
-    # Clean environment for vspython
-    # vs_path: list[str] = []
-    forbidden_names: tuple[str] = (
-        'python',
-        'conda',
-        'vapoursynth',
-        'ffmpeg',
-    )
-
-    # Create path used by vs subprocess
-    vs_path: list[str] = []
-    sep: str = ";"
-    if sys.platform == "win32":
-        for dir in ("Scripts", "vs-scripts", "vs-plugins", ""):
-            vs_path.insert(0, os.path.abspath(
-                os.path.join(root_dir, "external", "vspython", dir)
-            ))
-
-    elif sys.platform == "linux":
-        for dir in (
-            "/usr/lib/x86_64-linux-gnu/vapoursynth",
-            "/usr/lib/bin"
-        ):
-            vs_path.insert(0, dir)
-        sep = ':'
-
-    vs_path.insert(0, root_dir)
-
-    # Clean environnment for vs
-    vs_env = os.environ.copy()
-    if sys.platform == 'win32':
-        del vs_env['PATH']
-        for k, v in vs_env.copy().items():
-            k_lower, v_lower = k.lower(), v.lower()
-            for n in forbidden_names:
-                if n in k_lower:
-                    try:
-                        del vs_env[k]
-                        logger.debug(f"removing: {k}: {v}")
-                    except:
-                        pass
-
-                if n in v_lower:
-                    try:
-                        del vs_env[k]
-                        logger.debug(f"removing: {k}: {v}")
-                    except:
-                        pass
-        vs_env['PATH'] = sep.join(vs_path)
-
-    logger.debug(f"Environment:\n{pformat(vs_env)}")
-    # Environnment
-    if arguments.log or debug:
-        extract_info_from_vs_script(vs_command=vs_command, vs_env=vs_env)
-
-    # Vs process
-    vs_subprocess: subprocess.Popen | None = None
-    try:
-        vs_subprocess = subprocess.Popen(
-            vs_command,
-            stdin=subprocess.DEVNULL,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            env=vs_env,
-        )
-    except Exception as e:
-        print(f"[E] Unexpected error: {type(e)}", flush=True)
-
     if debug or arguments.log:
         print(lightcyan("Encoder command:"))
         print(lightgreen(' '.join(encoder_command)))
     logger.debug(f"Encoder command: {' '.join(encoder_command)}")
 
+    logger.debug(f"Environment:\n{pformat(vs_env)}")
+
     # Characteristics of the pipe
     frame_count: int = in_video_info['frame_count']
     h, w = in_video_info['shape'][:2]
@@ -294,27 +718,115 @@ Please install these dependencies (refer to the documentation).
         print(f"  nb of bytes: {in_nbytes}")
         print(f"  frame_count: {frame_count}")
 
-    frame: bytes = None
-    line: str = ''
-    os.set_blocking(encoder_subprocess.stdout.fileno(), False)
-    os.set_blocking(vs_subprocess.stderr.fileno(), False)
-    print(f"Processing:")
-    try:
-        for _ in range(frame_count):
-            # print(f"reading frame no. {i}", end="\r")
-            frame: bytes = vs_subprocess.stdout.read(in_nbytes)
-            if frame is None:
-                print(red("None"))
-            encoder_subprocess.stdin.write(frame)
-            line = encoder_subprocess.stdout.readline().decode('utf-8')
-            if line:
-                print(line.strip(), end='\r', file=sys.stderr)
-            line = vs_subprocess.stderr.readline().decode('utf-8')
-            if line:
-                print(line.strip(), end='\r', file=sys.stderr)
+    if arguments.two_stage:
+        if encode_two_stage(
+            arguments=arguments,
+            vs_command=vs_command,
+            vs_threads_index=vs_threads_index,
+            vs_env=vs_env,
+            vs_video_info=vs_video_info,
+            e_params=e_params,
+            in_media_info=in_media_info,
+            exclude_fp=exclude_fp,
+            out_media_path=out_media_path,
+            pool=pool,
+        ) and check_output(out_media_path, in_video_info, arguments):
+            print(lightcyan("Done."))
+        return
+
+    # Adaptive balancing: measure the relay stalls during the first
+    # seconds and restart with a new CPU split and/or encoder preset.
+    # Only the first window is measured: the restart is from the first
+    # frame, so at most one window of frames is processed twice
+    balance: BalanceController | None = None
+    if arguments.balance:
+        balance = BalanceController(
+            min_share=arguments.balance_min_share,
+            max_share=arguments.balance_max_share,
+            min_preset=arguments.balance_min_preset or None,
+        )
+    measured: bool = False
+
+    while True:
+        vs_subprocess, encoder_subprocess = start_processes(
+            vs_command=vs_command,
+            vs_env=vs_env,
+            encoder_command=encoder_command,
+            cpu_partition=cpu_partition,
+            pool=pool,
+        )
+        print(f"Processing:")
+        stats: RelayStats | None = None
+        if balance is not None and not measured:
+            stats = RelayStats()
+        relayed: int = relay_frames(
+            vs_subprocess,
+            encoder_subprocess,
+            frame_count=frame_count,
+            frame_nbytes=in_nbytes,
+            stats=stats,
+            window=arguments.balance_window,
+            verbose=arguments.log or debug,
+        )
+        if stats is None or relayed >= frame_count:
+            if pool is not None:
+                pool.release(vs_subprocess, relayed)
+            break
+
+        measured = True
+        decision: BalanceDecision | None = balance.decide(
+            stats, share=cpu_share, preset=e_params.preset
+        )
+        if decision is None:
+            print()
+            print(lightcyan("Balance:"), "settings are kept")
+            relayed += relay_frames(
+                vs_subprocess,
+                encoder_subprocess,
+                frame_count=frame_count - relayed,
+                frame_nbytes=in_nbytes,
+            )
+            if pool is not None:
+                pool.release(vs_subprocess, relayed)
+            break
+
+        # Restart from the first frame with the new settings
+        for process in (vs_subprocess, encoder_subprocess):
+            process.kill()
+            process.wait()
+        if pool is not None:
+            pool.release(vs_subprocess, relayed)
+        cpu_share, e_params.preset = decision.share, decision.preset
+        cpu_partition = partition_cpus(
+            vcodec=e_params.vcodec,
+            preset=e_params.preset,
+            share=cpu_share,
+            affinity=arguments.affinity,
+            numa_node=arguments.numa_node,
+        )
+        e_params.threads = cpu_partition.encoder_threads
+        vs_command[vs_threads_index] = f"threads={cpu_partition.filter_threads}"
+        encoder_command = generate_ffmpeg_encoder_cmd(
+            video_info=vs_video_info,
+            params=e_params,
+            in_media_info=in_media_info,
+        )
         print()
-    except:
-        pass
+        print(
+            lightcyan("Balance:"), f"{decision.reason}",
+            lightcyan("\n  restart with:"),
+            f"vs threads: {cpu_partition.filter_threads}, encoder threads: {cpu_partition.encoder_threads}, preset: {e_params.preset}"
+        )
+        logger.debug(f"VS command:\n{' '.join(vs_command)}")
+        logger.debug(f"Encoder command: {' '.join(encoder_command)}")
+
+    if balance is not None and balance.decisions:
+        # Settings to reproduce this run
+        balanced_args: str = f"--cpu_split {cpu_share:.2f}"
+        if e_params.preset:
+            balanced_args += f" --preset {e_params.preset}"
+        print(lightcyan("Balanced settings:"), balanced_args)
+        logger.debug(f"Balanced settings: {balanced_args}")
 
     stdout_b: bytes | None = None
     stderr_b: bytes | None = None
@@ -335,38 +847,28 @@ Please install these dependencies (refer to the documentation).
         if stderr:
             logger.debug(f"FFmpeg stderr:\n{stderr}")
 
-    # For evaluation purpose
-    # Enable this after validation
-    success: bool = True
-    if arguments.debug:
-        out_vi: VideoInfo = None
-        try:
-            out_vi: VideoInfo = extract_media_info(out_media_path)['video']
-        except:
-            success = False
-
-        if out_vi is None or out_vi['frame_count'] != in_video_info['frame_count']:
-            logger.debug(f"Number of frames differs")
-            success = False
-
-        if success and arguments.log:
-            frame_count_str: str = f"    {out_vi['frame_count']} frames"
-            h, w = out_vi['shape'][:2]
-            dim_str: str = f", {w}x{h}"
-            frame_rate_str: str = f", {frame_rate_to_str(out_vi['frame_rate_r'])} fps"
-            pix_fmt_str: str = f", {out_vi['pix_fmt']}"
-            _sar: tuple[int] = out_vi['sar']
-            sar_str: str = f", SAR {':'.join(map(str, _sar))}" if _sar[0] / _sar[1] != 1 else ""
-            _dar: tuple[int] = out_vi['dar']
-            dar_str: str = f", DAR {':'.join(map(str, _dar))}" if _dar[0] / _dar[1] != 1 else ""
-            out_vi_str: str = "".join((frame_count_str, dim_str, frame_rate_str, pix_fmt_str, sar_str, dar_str))
-            logger.debug(f"output video format: {out_vi_str}")
-
-    if not os.path.isfile(out_media_path) or not success:
+    if e_params.benchmark:
+        return
+    success: bool = (
+        encoder_subprocess.returncode == 0
+        and mux_tracks(
+            video_fp=video_fp,
+            out_media_path=out_media_path,
+            e_params=e_params,
+            vs_video_info=vs_video_info,
+            in_media_info=in_media_info,
+        )
+    )
+    if not success:
         print(red(f"Error: failed to generate {out_media_path}"))
+        if os.path.isfile(video_fp):
+            # The encoded video is kept so that it can be muxed again
+            print(red(f"The video stream is kept in {video_fp}"))
         return
-
-    print(lightcyan("Done."))
+    if os.path.isfile(video_fp):
+        os.remove(video_fp)
+    if check_output(out_media_path, in_video_info, arguments):
+        print(lightcyan("Done."))
 
 
 
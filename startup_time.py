@@ -0,0 +1,91 @@
+"""Startup time of py_temporalfix.
+Imports the driver with `python -X importtime`, reports the slowest modules
+and fails if the import time exceeds the budget:
+    python startup_time.py --budget 150
+"""
+from argparse import (
+    ArgumentParser,
+    Namespace,
+    RawTextHelpFormatter,
+)
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from utils.p_print import *
+
+
+def measure_import(root_dir: str) -> tuple[float, dict[str, float]]:
+    """Returns the total import time (ms) of py_temporalfix and the
+    cumulative import time (ms) of each module
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import py_temporalfix"],
+        cwd=root_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    modules: dict[str, float] = {}
+    for line in process.stderr.decode('utf-8').split('\n'):
+        # import time: self [us] | cumulative | imported package
+        if (match := re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)):
+            modules[match.group(4)] = int(match.group(2)) / 1000
+    return modules.get('py_temporalfix', 0.), modules
+
+
+def measure_help(root_dir: str) -> float:
+    """Returns the duration (ms) of `py_temporalfix.py --help`"""
+    start_time: float = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "py_temporalfix.py", "--help"],
+        cwd=root_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return (time.perf_counter() - start_time) * 1000
+
+
+def main():
+    parser = ArgumentParser(
+        description="Startup time of py_temporalfix",
+        formatter_class=RawTextHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Nb of runs, the median is reported.")
+    parser.add_argument("--top", type=int, default=10, help="Nb of slowest modules to display.")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0,
+        help="Maximum import time (ms). Exit with an error if exceeded. Default: no budget."
+    )
+    arguments: Namespace = parser.parse_args()
+    root_dir: str = os.path.dirname(os.path.abspath(__file__))
+
+    import_times: list[float] = []
+    modules: dict[str, float] = {}
+    for _ in range(arguments.runs):
+        import_time, modules = measure_import(root_dir)
+        import_times.append(import_time)
+    import_time = statistics.median(import_times)
+    help_time: float = statistics.median(measure_help(root_dir) for _ in range(arguments.runs))
+
+    print(lightcyan("Import time:"), f"{import_time:.1f} ms")
+    print(lightcyan("--help:"), f"{help_time:.1f} ms (including the interpreter startup)")
+    print(lightcyan("Slowest modules (cumulative):"))
+    top_modules = sorted(
+        ((m, t) for m, t in modules.items() if m != 'py_temporalfix'),
+        key=lambda m: m[1],
+        reverse=True
+    )[:arguments.top]
+    for module, duration in top_modules:
+        print(f"  {duration:8.1f} ms  {module}")
+
+    if arguments.budget and import_time > arguments.budget:
+        sys.exit(red(f"Error: import time {import_time:.1f} ms exceeds the budget of {arguments.budget:.0f} ms"))
+
+
+if __name__ == "__main__":
+    main()
@@ -37,8 +37,11 @@ def arg_parse() -> Namespace:
         "-i",
         "--input",
         type=str,
+        nargs="+",
+        action="extend",
         required=True,
-        help="""Input video file.
+        help="""Input video file(s). Several files are processed one after the other,
+see --warm_workers.
 """
     )
 
@@ -60,6 +63,26 @@ def arg_parse() -> Namespace:
 """
     )
 
+    parser.add_argument(
+        "--source_filter",
+        choices=['bs', 'ffms2', 'lsmas'],
+        default='bs',
+        required=False,
+        help="""Source filter used to decode the input video:
+BestSource (bs), FFMS2 (ffms2) or L-SMASH-Works (lsmas).
+The index is cached and reused by the next runs.
+\n"""
+    )
+
+    parser.add_argument(
+        "--decoder_threads",
+        type=int,
+        default=0,
+        required=False,
+        help="""Nb of decoder threads of the source filter. 0: auto.
+\n"""
+    )
+
     parser.add_argument(
         "-tr",
         "--t_radius",
@@ -84,6 +107,107 @@ Higher means more aggressive.
 \n"""
     )
 
+    parser.add_argument(
+        "--tf_preset",
+        choices=['draft', 'fast', 'balanced', 'quality'],
+        default='balanced',
+        required=False,
+        help="""Speed/quality preset of the motion search and detail recovery
+settings: block size, overlap, pel, search range, MinBlur radius, colorfix.
+draft and fast are for dailies, quality for final masters.
+\n"""
+    )
+
+    parser.add_argument(
+        "--me_downscale",
+        type=int,
+        choices=[1, 2],
+        default=1,
+        required=False,
+        help="""Divide the pel of the preset by this factor: the motion vectors
+are searched on a prefilter which is less upscaled (2: not upscaled), with
+whole pixel instead of subpixel precision. Faster. No effect when the pel
+of the preset is already 1 (fast, draft, balanced for widths > 2400).
+\n"""
+    )
+
+    parser.add_argument(
+        "--fast_tr",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""When tr > 6, approximate the mvtools-sf (32-bit float) degrain
+with groups of 16-bit mvtools degrains. Faster, but the output differs:
+the weights of the groups are not the per block weights of a single degrain.
+\n"""
+    )
+
+    parser.add_argument(
+        "--reuse_vectors",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Refine the coarse motion vectors of the prefilter instead of
+searching the motion vectors again. Faster.
+Requires pel 1: --tf_preset fast or draft, or balanced for widths > 2400,
+or --me_downscale 2.
+Not supported for tr > 6 without --fast_tr.
+\n"""
+    )
+
+    parser.add_argument(
+        "--static",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Frames of static shots (interviews, slides, title cards) are
+averaged without motion search. Faster.
+\n"""
+    )
+
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Detect the duplicate frames (animation on 2s or 3s, telecine)
+and process each unique frame once. The duplicate map is cached
+per input file.
+\n"""
+    )
+
+    parser.add_argument(
+        "--autocrop",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Detect the black borders (letterbox, pillarbox), which are
+not filtered and added back unchanged. The output dimensions do not
+change. The borders are detected once per input file.
+\n"""
+    )
+
+    parser.add_argument(
+        "--exclude",
+        type=str,
+        required=False,
+        default="",
+        help="""Frames which are not processed, e.g. credits or title cards.
+Ranges (inclusive) and single frames: "[100 300] [600 900] 1500"
+\n"""
+    )
+
+    parser.add_argument(
+        "--exclude_file",
+        type=str,
+        required=False,
+        default="",
+        help="""Text file which contains the frames which are not processed,
+same syntax as --exclude. Used in addition to --exclude.
+\n"""
+    )
+
+
 
     # Seeking
     parser.add_argument(
@@ -198,6 +322,162 @@ recommended: yuv420p, yuv420p10le, yuv420p12le
     )
 
 
+    # CPU
+    parser.add_argument(
+        "--cpu_split",
+        type=float,
+        default=0,
+        required=False,
+        help="""Share of the CPUs given to the vs script, the encoder gets
+the others, e.g. 0.8. Default: estimated from the encoder and preset,
+see --encoder_cost.
+\n"""
+    )
+    parser.add_argument(
+        "--encoder_cost",
+        type=float,
+        default=0,
+        required=False,
+        help="""Cost of encoding a frame relative to filtering it with the vs script,
+e.g. 0.5: the vs script gets 1 / (1 + cost) of the CPUs. Ignored with
+--cpu_split. Default: rough estimate from the encoder and preset
+(not measured on this machine, use --balance to measure it).
+\n"""
+    )
+    parser.add_argument(
+        "--affinity",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Run the vs script and the encoder on separate CPUs.
+\n"""
+    )
+    parser.add_argument(
+        "--numa_node",
+        type=int,
+        default=-1,
+        required=False,
+        help="""Run the vs script and the encoder on the CPUs of this NUMA node (linux).
+\n"""
+    )
+    parser.add_argument(
+        "--balance",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Measure the time the vs script and the encoder wait for each other
+during the first seconds (--balance_window), then restart from the
+first frame with a new CPU split (and encoder preset, see
+--balance_min_preset) so both run near saturation. Only this first
+window is measured: at most one restart, the frames of the window are
+processed twice. The decisions are printed and logged.
+\n"""
+    )
+    parser.add_argument(
+        "--balance_window",
+        type=float,
+        default=30,
+        required=False,
+        help="""Duration (s) of the measure.
+\n"""
+    )
+    parser.add_argument(
+        "--balance_min_share",
+        type=float,
+        default=0.25,
+        required=False,
+        help="""Minimum share of the CPUs given to the vs script.
+\n"""
+    )
+    parser.add_argument(
+        "--balance_max_share",
+        type=float,
+        default=0.95,
+        required=False,
+        help="""Maximum share of the CPUs given to the vs script.
+\n"""
+    )
+    parser.add_argument(
+        "--balance_min_preset",
+        choices=[
+            'ultrafast',
+            'superfast',
+            'veryfast',
+            'faster',
+            'fast',
+            'medium',
+            'slow',
+            'slower',
+            'veryslow',
+        ],
+        default='',
+        required=False,
+        help="""Fastest encoder preset allowed when the encoder is the bottleneck
+and the share of the vs script is at its minimum.
+Default: the preset is not modified.
+\n"""
+    )
+
+    # Two-stage encoding
+    parser.add_argument(
+        "--two_stage",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Save the vs script output once to a lossless intermediate file
+(FFV1), then encode chunks of it with parallel encoders.
+The intermediate file is reused by the next runs with the same
+script parameters: only the encoding is done again.
+\n"""
+    )
+    parser.add_argument(
+        "--encoders",
+        type=int,
+        default=0,
+        required=False,
+        help="""Nb of parallel encoders of the two-stage encoding.
+0: 1 per 8 CPUs.
+\n"""
+    )
+    parser.add_argument(
+        "--intermediate_dir",
+        type=str,
+        default="",
+        required=False,
+        help="""Directory of the intermediate files, e.g. a fast scratch disk.
+Default: the temporary directory.
+\n"""
+    )
+
+    # Warm workers
+    parser.add_argument(
+        "--warm_workers",
+        type=int,
+        default=0,
+        required=False,
+        help="""Run the vs script in persistent workers which keep the vs core
+initialized (plugins loaded) between the input files, instead of
+starting vspipe for each file. Nb of workers kept warm. 0: disabled.
+\n"""
+    )
+    parser.add_argument(
+        "--worker_jobs",
+        type=int,
+        default=20,
+        required=False,
+        help="""A worker is replaced after this nb of input files, to release its memory.
+\n"""
+    )
+    parser.add_argument(
+        "--worker_memory",
+        type=int,
+        default=0,
+        required=False,
+        help="""A worker is replaced when its memory (MB) exceeds this value
+after an input file. 0: no limit.
+\n"""
+    )
+
     # Benchmark
     parser.add_argument(
         "--benchmark",
@@ -0,0 +1,114 @@
+from dataclasses import dataclass, field
+
+from .logger import logger
+
+
+# Presets ordered from the fastest to the slowest
+ENCODER_PRESETS: tuple[str] = (
+    'ultrafast',
+    'superfast',
+    'veryfast',
+    'faster',
+    'fast',
+    'medium',
+    'slow',
+    'slower',
+    'veryslow',
+)
+
+
+@dataclass(slots=True)
+class RelayStats:
+    """Time spent by the driver waiting for each side of the relay"""
+    frames: int = 0
+    # Waiting for the vs script: the filter is the bottleneck
+    read_time: float = 0.
+    # Waiting for the encoder: the encoder is the bottleneck
+    write_time: float = 0.
+    elapsed: float = 0.
+
+    def imbalance(self) -> float:
+        """Returns a value in [-1, 1]: > 0 when the filter is the
+        bottleneck, < 0 when the encoder is
+        """
+        if self.elapsed <= 0:
+            return 0.
+        return (self.read_time - self.write_time) / self.elapsed
+
+    def fps(self) -> float:
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.
+
+
+@dataclass(slots=True)
+class BalanceDecision:
+    share: float
+    preset: str | None
+    reason: str
+
+
+@dataclass
+class BalanceController:
+    """Adjusts the share of the CPUs given to the filter, then the encoder
+    preset, until the filter and the encoder run near saturation.
+    min_share, max_share: bounds of the share of the filter.
+    min_preset: fastest encoder preset allowed, None: the preset is not
+    modified.
+    tolerance: imbalance below which the pipeline is considered balanced.
+    """
+    min_share: float = 0.25
+    max_share: float = 0.95
+    min_preset: str | None = None
+    tolerance: float = 0.1
+    gain: float = 0.5
+    decisions: list[BalanceDecision] = field(default_factory=list)
+
+
+    def decide(
+        self,
+        stats: RelayStats,
+        share: float,
+        preset: str | None,
+    ) -> BalanceDecision | None:
+        """Returns the new settings, None if the current ones are kept"""
+        imbalance: float = stats.imbalance()
+        measure: str = (
+            f"{stats.frames} frames, {stats.fps():.2f} fps, "
+            f"waiting for the filter: {stats.read_time:.1f}s, "
+            f"for the encoder: {stats.write_time:.1f}s"
+        )
+        logger.debug(f"Balance: {measure}, imbalance={imbalance:.3f}")
+        if abs(imbalance) < self.tolerance:
+            logger.debug("Balance: balanced")
+            return None
+
+        # Proportional step towards the bottleneck, within the bounds
+        if imbalance > 0:
+            new_share = share + self.gain * imbalance * (1. - share)
+        else:
+            new_share = share + self.gain * imbalance * share
+        new_share = round(min(max(new_share, self.min_share), self.max_share), 2)
+
+        new_preset: str | None = preset
+        if (
+            abs(new_share - share) < 0.01
+            and imbalance < 0
+            and self.min_preset in ENCODER_PRESETS
+            and preset in ENCODER_PRESETS
+        ):
+            # The filter share is at its lower bound: use a faster preset
+            new_preset = ENCODER_PRESETS[
+                max(ENCODER_PRESETS.index(preset) - 1, ENCODER_PRESETS.index(self.min_preset))
+            ]
+
+        if abs(new_share - share) < 0.01 and new_preset == preset:
+            logger.debug("Balance: bound reached, settings are kept")
+            return None
+
+        decision: BalanceDecision = BalanceDecision(
+            share=new_share,
+            preset=new_preset,
+            reason=f"{'filter' if imbalance > 0 else 'encoder'} is the bottleneck ({measure})",
+        )
+        self.decisions.append(decision)
+        logger.debug(f"Balance: {decision}")
+        return decision
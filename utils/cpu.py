@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+import os
+import re
+import subprocess
+import sys
+
+from .media import VideoCodec
+
+
+# Cost of encoding a frame relative to filtering it with vs_temporalfix,
+# default settings, 1080p, 'slow' encoder preset.
+# These are rough estimates, not measures: use --encoder_cost to override
+# the cost, --cpu_split to override the resulting share, or --balance to
+# measure it.
+ENCODER_COST: dict[VideoCodec, float] = {
+    VideoCodec.H264: 0.15,
+    VideoCodec.H265: 0.5,
+    VideoCodec.VP9: 0.6,
+    VideoCodec.FFV1: 0.1,
+    VideoCodec.DNXHD: 0.05,
+}
+
+# Cost of the x264/x265 presets relative to 'slow', estimates
+PRESET_COST: dict[str, float] = {
+    'ultrafast': 0.1,
+    'superfast': 0.15,
+    'veryfast': 0.25,
+    'faster': 0.35,
+    'fast': 0.5,
+    'medium': 0.65,
+    'slow': 1.,
+    'slower': 2.,
+    'veryslow': 4.,
+}
+
+
+@dataclass(slots=True)
+class CpuPartition:
+    # Nb of threads of the vs core
+    filter_threads: int
+    # Nb of threads of the encoder
+    encoder_threads: int
+    # CPUs of each process when affinity is enabled
+    filter_cpus: list[int] | None = None
+    encoder_cpus: list[int] | None = None
+
+
+def available_cpus() -> list[int]:
+    """Returns the CPUs this process is allowed to run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_node_cpus(node: int) -> list[int]:
+    """Returns the CPUs of a NUMA node (linux), an empty list if unknown"""
+    cpulist_fp: str = f"/sys/devices/system/node/node{node}/cpulist"
+    try:
+        with open(cpulist_fp, mode='r') as cpulist_file:
+            cpulist: str = cpulist_file.read().strip()
+    except OSError:
+        return []
+    cpus: list[int] = []
+    for cpu_range in cpulist.split(','):
+        if (match := re.match(r"^(\d+)(?:-(\d+))?$", cpu_range)):
+            start, end = match.groups()
+            cpus.extend(range(int(start), int(end if end is not None else start) + 1))
+    return cpus
+
+
+def filter_share(
+    vcodec: VideoCodec,
+    preset: str | None,
+    encoder_cost: float = 0.,
+) -> float:
+    """Returns the share of the CPUs given to the filter: the filter and
+    the encoder should process the same nb of frames per second.
+    encoder_cost: cost of encoding a frame relative to filtering it,
+    0: estimated from the codec and the preset.
+    """
+    if encoder_cost <= 0:
+        encoder_cost = ENCODER_COST.get(vcodec, 0.5)
+        if vcodec in (VideoCodec.H264, VideoCodec.H265) and preset:
+            encoder_cost *= PRESET_COST.get(preset, 1.)
+    return 1. / (1. + encoder_cost)
+
+
+def partition_cpus(
+    vcodec: VideoCodec,
+    preset: str | None,
+    share: float = 0.,
+    affinity: bool = False,
+    numa_node: int = -1,
+) -> CpuPartition:
+    """Splits the CPUs between the vs core and the encoder.
+    share: share of the CPUs given to the filter, 0: estimated from the
+    encoder cost.
+    affinity: each process runs on its own CPUs.
+    numa_node: both processes run on the CPUs of this NUMA node (linux).
+    """
+    cpus: list[int] = available_cpus()
+    if numa_node >= 0:
+        node_cpus: list[int] = [c for c in numa_node_cpus(numa_node) if c in cpus]
+        if node_cpus:
+            cpus = node_cpus
+
+    if share <= 0:
+        share = filter_share(vcodec, preset)
+    share = min(max(share, 0.), 1.)
+    filter_threads: int = min(max(round(len(cpus) * share), 1), len(cpus))
+    encoder_threads: int = max(len(cpus) - filter_threads, 1)
+
+    partition: CpuPartition = CpuPartition(
+        filter_threads=filter_threads,
+        encoder_threads=encoder_threads,
+    )
+    if affinity and len(cpus) > 1:
+        filter_threads = min(filter_threads, len(cpus) - 1)
+        partition.filter_threads = filter_threads
+        partition.encoder_threads = len(cpus) - filter_threads
+        partition.filter_cpus = cpus[:filter_threads]
+        partition.encoder_cpus = cpus[filter_threads:]
+    elif numa_node >= 0:
+        partition.filter_cpus = partition.encoder_cpus = cpus
+    return partition
+
+
+def set_process_affinity(process: subprocess.Popen, cpus: list[int] | None) -> bool:
+    """Restricts a process to some CPUs. Returns False if not supported"""
+    if not cpus:
+        return True
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(process.pid, cpus)
+            return True
+        if sys.platform == "win32":
+            import ctypes
+            mask: int = sum(1 << c for c in cpus)
+            return bool(
+                ctypes.windll.kernel32.SetProcessAffinityMask(int(process._handle), mask)
+            )
+    except (OSError, ValueError, AttributeError):
+        pass
+    return False
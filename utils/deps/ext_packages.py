@@ -15,7 +15,7 @@ from rich.progress import (
 
 from ..p_print import *
 from ..path_utils import get_app_tempdir, get_extension
-from ..tools import external_dir
+from ..tools import external_dir, prepare_external_dir
 from ..time_conversions import reformat_datetime
 from .logger import logger
 
@@ -140,6 +140,7 @@ def download_install_ext_package(
     package.tmp_file=os.path.join(temp_dir, package.dirname, package.filename)
 
     # Check if installed
+    prepare_external_dir()
     package.install_dir = os.path.join(external_dir, package.dirname)
     if os.path.exists(os.path.join(package.install_dir, last_modified)):
         package.installed = True
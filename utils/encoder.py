@@ -69,6 +69,8 @@ class VideoEncoderParams:
     codec_settings: CodecSettings | None = None
     color_settings: ColorSettings | None = None
     ffmpeg_args: str = ''
+    # Nb of encoder threads, 0: decided by the encoder
+    threads: int = 0
     # Audio
     copy_audio: bool = False
     # Debug
@@ -158,12 +160,16 @@ def arguments_to_encoder_params(
 def generate_ffmpeg_encoder_cmd(
     video_info: VideoInfo,
     params: VideoEncoderParams,
-    in_media_info: MediaInfo
+    in_media_info: MediaInfo,
+    input_args: list[str] | None = None,
 ) -> list[str]:
-    """Generate a FFmpeg command line from parameters and info
+    """Generate a FFmpeg command line from parameters and info.
+    The output file contains the video stream only: the audio/subtitles
+    tracks and the metadata are added by the mux stage.
     video_info: info of the stream sent to the stdin pipe of FFmpeg
     in_media_info: info of the original media. Used to copy characteristics
-    and audio/subtitles tracks to the output file.
+    to the output file.
+    input_args: video input used instead of the stdin pipe
     """
     in_vi: VideoInfo = in_media_info['video']
     fps: str = ""
@@ -181,15 +187,17 @@ def generate_ffmpeg_encoder_cmd(
         "-hide_banner",
         "-loglevel", "error",
         "-stats",
-        '-f', 'rawvideo',
-        '-pixel_format', video_info['pix_fmt'],
-        '-video_size', f"{w}x{h}",
-        "-r", fps,
-        '-i', 'pipe:0'
     ]
-
-    if params.copy_audio and in_media_info['audio']['nstreams'] > 0:
-        ffmpeg_command.extend(['-i', in_vi['filepath']])
+    if input_args is not None:
+        ffmpeg_command.extend(input_args)
+    else:
+        ffmpeg_command.extend([
+            '-f', 'rawvideo',
+            '-pixel_format', video_info['pix_fmt'],
+            '-video_size', f"{w}x{h}",
+            "-r", fps,
+            '-i', 'pipe:0'
+        ])
 
     if params.benchmark:
         ffmpeg_command.extend(["-benchmark", "-f", "null", "-"])
@@ -236,9 +244,16 @@ def generate_ffmpeg_encoder_cmd(
     ):
         ffmpeg_command.extend(["-crf", f"{params.crf}"])
 
+    # Threads: libx265 uses its own pools, see custom params
+    if params.threads > 0 and "-threads" not in params.ffmpeg_args:
+        if isinstance(params.codec_settings, FFv1Settings):
+            params.codec_settings.threads = params.threads
+        elif params.vcodec != VideoCodec.H265:
+            ffmpeg_command.extend(["-threads", str(params.threads)])
+
     if params.codec_settings is not None:
         for k, v in params.codec_settings.__dict__.items():
-            ffmpeg_command.extend([f"-{k}", v])
+            ffmpeg_command.extend([f"-{k}", str(v)])
 
     # Color space
     color_settings: ColorSettings = params.color_settings
@@ -257,6 +272,9 @@ def generate_ffmpeg_encoder_cmd(
         ])
 
     k, v = 'color_range', color_settings.color_range
+    if params.pix_fmt.startswith('yuvj'):
+        # Full range pixel format
+        v = 'full'
     if (
         k not in params.ffmpeg_args
         and v is not None
@@ -266,32 +284,25 @@ def generate_ffmpeg_encoder_cmd(
         # full: tuple[str] = ("pc", "jpeg", "full")
         ffmpeg_command.extend([f"-{k}", "limited" if v.lower() in limited else "full"])
 
-    # Audio/subtitles
-    if params.copy_audio and True:
-        if in_media_info['audio']['nstreams'] > 0:
-            ffmpeg_command.extend([
-                "-map", "1:a", "-acodec", "copy"
-            ])
-        if in_media_info['subtitles']['nstreams'] > 0:
-            ffmpeg_command.extend([
-                "-map", "2:s", "-scodec", "copy"
-            ])
-
     # Custom params
     codec_params: str = params.ffmpeg_args
     if not codec_params and params.vcodec == VideoCodec.H265:
         # Add default if no custom params for H265
         codec_params = "-profile:v main422-10 -x265-params sao=0"
-    ffmpeg_command.extend(codec_params.split(" "))
-
-    # Add metadata
-    if get_extension(params.filepath) == ".mkv":
-        ffmpeg_command.extend(["-movflags", "use_metadata_tags"])
-        metadata: dict[str, str]
-        for metadata in (video_info['metadata'], in_vi['metadata']):
-            if metadata is not None and len(metadata.keys()):
-                for k, meta in metadata.items():
-                    ffmpeg_command.extend(["-metadata:s:v:0", f"{k}={meta}"])
+    if (
+        params.vcodec == VideoCodec.H265
+        and params.threads > 0
+        and "pools=" not in codec_params
+    ):
+        x265_threads: str = f"pools={params.threads}:frame-threads={max(1, min(6, params.threads // 4))}"
+        if "-x265-params" in codec_params:
+            codec_params = re.sub(
+                r"-x265-params\s+(\S+)", rf"-x265-params \1:{x265_threads}", codec_params
+            )
+        else:
+            codec_params = f"{codec_params} -x265-params {x265_threads}".strip()
+    if codec_params:
+        ffmpeg_command.extend(codec_params.split(" "))
 
     # Output filepath
     ffmpeg_command.append(params.filepath)
@@ -303,3 +314,95 @@ def generate_ffmpeg_encoder_cmd(
     # ffmpeg_command = _tmp.split(" ")
 
     return ffmpeg_command
+
+
+
+def generate_ffmpeg_intermediate_cmd(
+    video_info: VideoInfo,
+    filepath: str,
+    threads: int = 0,
+) -> list[str]:
+    """Generate a FFmpeg command line which saves the stdin pipe to a lossless
+    intermediate file: FFV1 level 3, intra only so that it can be split at any
+    frame, sliced to use the threads.
+    """
+    f_rate = video_info['frame_rate_r']
+    if isinstance(f_rate, tuple | list):
+        fps = ":".join(map(str, f_rate))
+    else:
+        fps = str(f_rate)
+    h, w = video_info['shape'][:2]
+    threads = threads if threads > 0 else 8
+    slices: int = next(s for s in (24, 16, 12, 9, 6, 4) if s <= max(threads, 4))
+
+    return [
+        ffmpeg_exe,
+        "-hide_banner",
+        "-loglevel", "error",
+        "-stats",
+        '-f', 'rawvideo',
+        '-pixel_format', video_info['pix_fmt'],
+        '-video_size', f"{w}x{h}",
+        "-r", fps,
+        '-i', 'pipe:0',
+        "-map", "0:v",
+        "-vcodec", VideoCodec.FFV1.value,
+        "-pix_fmt", video_info['pix_fmt'],
+        "-level", "3",
+        "-g", "1",
+        "-slices", str(slices),
+        "-slicecrc", "0",
+        "-threads", str(threads),
+        "-f", "matroska",
+        filepath,
+        "-y",
+    ]
+
+
+
+def generate_ffmpeg_mux_cmd(
+    video_fp: str,
+    out_fp: str,
+    params: VideoEncoderParams,
+    video_info: VideoInfo,
+    in_media_info: MediaInfo,
+    concat: bool = False,
+) -> list[str]:
+    """Generate a FFmpeg command line which copies, in a single pass, the
+    encoded video stream, the audio/subtitles tracks and the chapters of the
+    original media and the metadata to the output file.
+    video_fp: encoded video, or a list of files for the concat demuxer
+    """
+    in_vi: VideoInfo = in_media_info['video']
+    ffmpeg_command = [
+        ffmpeg_exe,
+        "-hide_banner",
+        "-loglevel", "error",
+    ]
+    if concat:
+        ffmpeg_command.extend(["-f", "concat", "-safe", "0"])
+    ffmpeg_command.extend(["-i", video_fp])
+
+    # The original media is not used when the video is clipped
+    if params.copy_audio:
+        ffmpeg_command.extend(["-i", in_vi['filepath']])
+    ffmpeg_command.extend(["-map", "0:v", "-c:v", "copy"])
+    if params.copy_audio:
+        if in_media_info['audio']['nstreams'] > 0:
+            ffmpeg_command.extend(["-map", "1:a", "-c:a", "copy"])
+        if in_media_info['subtitles']['nstreams'] > 0:
+            ffmpeg_command.extend(["-map", "1:s", "-c:s", "copy"])
+        ffmpeg_command.extend(["-map_chapters", "1", "-map_metadata", "1"])
+
+    if get_extension(out_fp) == ".mkv":
+        ffmpeg_command.extend(["-movflags", "use_metadata_tags"])
+        metadata: dict[str, str]
+        for metadata in (video_info['metadata'], in_vi['metadata']):
+            if metadata is not None and len(metadata.keys()):
+                for k, meta in metadata.items():
+                    ffmpeg_command.extend(["-metadata:s:v:0", f"{k}={meta}"])
+
+    ffmpeg_command.append(out_fp)
+    if params.overwrite:
+        ffmpeg_command.append('-y')
+    return ffmpeg_command
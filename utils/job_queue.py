@@ -0,0 +1,168 @@
+"""Persistent queue of the job server, stored in a SQLite database"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Literal
+
+
+JobStatus = Literal['queued', 'running', 'done', 'failed', 'canceled']
+
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL DEFAULT '',
+    args TEXT NOT NULL DEFAULT '[]',
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    frame INTEGER NOT NULL DEFAULT 0,
+    frame_count INTEGER NOT NULL DEFAULT 0,
+    returncode INTEGER,
+    message TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS watched (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+class JobQueue:
+    """Jobs are picked by priority (higher first), then by submission order.
+    The connection is shared by the threads of the server.
+    """
+
+    def __init__(self, db_fp: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(db_fp)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_fp, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+            # Jobs interrupted by a stop of the server are started again
+            self._db.execute(
+                "UPDATE jobs SET status='queued', progress=0, frame=0, started=NULL WHERE status='running'"
+            )
+
+
+    def _to_dict(self, row: sqlite3.Row) -> dict[str, Any]:
+        job: dict[str, Any] = dict(row)
+        job['args'] = json.loads(job['args'])
+        return job
+
+
+    def submit(
+        self,
+        input: str,
+        output: str = "",
+        args: list[str] | None = None,
+        priority: int = 0,
+    ) -> int:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (input, output, args, priority, created) VALUES (?, ?, ?, ?, ?)",
+                (input, output, json.dumps(args if args is not None else []), priority, time.time())
+            )
+        return cursor.lastrowid
+
+
+    def get(self, job_id: int) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+
+    def list(self, status: JobStatus | None = None) -> list[dict[str, Any]]:
+        with self._lock:
+            if status is None:
+                rows = self._db.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status=? ORDER BY id", (status,)
+                ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+    def next_queued(self) -> dict[str, Any] | None:
+        """Marks the next job as running and returns it"""
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status='queued' ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status='running', started=? WHERE id=?", (time.time(), row['id'])
+            )
+        job = self._to_dict(row)
+        job['status'] = 'running'
+        return job
+
+
+    def update(self, job_id: int, **fields) -> None:
+        if not fields:
+            return
+        columns: str = ", ".join(f"{k}=?" for k in fields.keys())
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id=?", (*fields.values(), job_id))
+
+
+    def finish(
+        self,
+        job_id: int,
+        status: JobStatus,
+        returncode: int | None = None,
+        message: str = "",
+    ) -> None:
+        """Sets the final status, a canceled job stays canceled"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status=?, returncode=?, message=?, finished=? WHERE id=? AND status!='canceled'",
+                (status, returncode, message, time.time(), job_id)
+            )
+
+
+    def cancel(self, job_id: int) -> JobStatus | None:
+        """Marks a queued or running job as canceled, returns its previous
+        status, None if it does not exist
+        """
+        with self._lock, self._db:
+            row = self._db.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row['status'] in ('queued', 'running'):
+                self._db.execute(
+                    "UPDATE jobs SET status='canceled', finished=? WHERE id=?", (time.time(), job_id)
+                )
+        return row['status']
+
+
+    def is_watched(self, path: str, size: int, mtime_ns: int) -> bool:
+        """Returns True if this version of a file of the drop folder has
+        already been submitted, otherwise records it
+        """
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT size, mtime_ns FROM watched WHERE path=?", (path,)
+            ).fetchone()
+            if row is not None and row['size'] == size and row['mtime_ns'] == mtime_ns:
+                return True
+            self._db.execute(
+                "INSERT OR REPLACE INTO watched (path, size, mtime_ns) VALUES (?, ?, ?)",
+                (path, size, mtime_ns)
+            )
+        return False
@@ -1,13 +1,15 @@
+from copy import deepcopy
 from enum import Enum
 import json
+import os
 import sys
-import numpy as np
 from pprint import pprint
 import subprocess
 from typing import Any, Literal, TypedDict
 
 from .time_conversions import FrameRate
 from .pxl_fmt import PIXEL_FORMAT
+from .source_cache import load_source_cache, save_source_cache
 from .tools import ffprobe_exe
 
 
@@ -62,7 +64,8 @@ class SubtitleInfo(TypedDict):
 class VideoInfo(TypedDict):
     # Note: keep TypeDict until works enough to change to class
     shape: tuple[int, int, int]
-    dtype: np.dtype
+    # numpy dtype name, e.g. 'uint16'
+    dtype: str
     bpp: int
 
     c_order: Literal['bgr', 'rgb', 'yuv']
@@ -79,11 +82,14 @@ class VideoInfo(TypedDict):
     profile: str
 
     pix_fmt: str
-    color_range: str
+    color_range: str | None
     color_space: str
     color_transfer: str
     color_primaries: str
     frame_count: int
+    # True when frame_count comes from the container or from the packets,
+    # False when it is estimated from the duration and the frame rate
+    frame_count_exact: bool
     duration: float
     metadata: Any
     filepath: str
@@ -112,21 +118,107 @@ def get_video_resolution(video_filepath):
 
 
 
-def get_media_info(media_filepath: str):
+# Only the fields used by extract_media_info are requested.
+# Change the cache name when this list is modified
+_probe_entries: str = ':'.join((
+    "format=duration",
+    "stream=" + ','.join((
+        'codec_type', 'codec_name', 'profile', 'width', 'height',
+        'sample_aspect_ratio', 'display_aspect_ratio', 'field_order',
+        'r_frame_rate', 'avg_frame_rate', 'nb_frames', 'pix_fmt', 'color_space',
+        'color_transfer', 'color_primaries', 'color_range',
+    )),
+    "stream_tags",
+))
+_probe_cache_name: str = "probe_v2"
+
+# In-process cache, key: (path, size, mtime)
+_media_info_cache: dict[tuple[str, int, int], dict] = {}
+
+
+def _media_info_key(media_filepath: str) -> tuple[str, int, int]:
+    stat = os.stat(media_filepath)
+    return (os.path.abspath(media_filepath), stat.st_size, stat.st_mtime_ns)
+
+
+def get_media_info(media_filepath: str, use_cache: bool = True) -> dict:
+    """Returns the ffprobe info of a media file.
+    The results are cached in memory and on disk, keyed by the path, size and
+    modification time of the file.
+    """
+    key = _media_info_key(media_filepath)
+    if use_cache:
+        media_info: dict | None = _media_info_cache.get(key, None)
+        if media_info is None:
+            media_info = load_source_cache(media_filepath, _probe_cache_name)
+        if media_info is not None:
+            _media_info_cache[key] = media_info
+            return deepcopy(media_info)
+
     ffprobe_command = [
         ffprobe_exe,
         "-v", "error",
-        '-show_format',
-        '-show_streams',
+        '-show_entries', _probe_entries,
         '-of','json',
         media_filepath
     ]
     process = subprocess.run(ffprobe_command, stdout=subprocess.PIPE)
-    return json.loads(process.stdout.decode('utf-8'))
+    media_info = json.loads(process.stdout.decode('utf-8'))
+    if 'format' in media_info and media_info.get('streams', None):
+        _media_info_cache[key] = media_info
+        save_source_cache(media_filepath, _probe_cache_name, media_info)
+    return deepcopy(media_info)
+
+
+def get_media_info_bulk(
+    media_filepaths: list[str],
+    max_workers: int = 8,
+    use_cache: bool = True,
+) -> dict[str, dict]:
+    """Probes many media files at once, the ffprobe processes are run
+    by a pool of threads. Returns a dict: filepath -> ffprobe info.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        media_infos = executor.map(
+            lambda fp: get_media_info(fp, use_cache=use_cache),
+            media_filepaths
+        )
+        return dict(zip(media_filepaths, media_infos))
+
 
 
+def count_video_frames(media_filepath: str, use_cache: bool = True) -> int | None:
+    """Returns the exact nb of frames of the first video stream: the packets
+    are counted by demuxing the file, without decoding. The count is cached
+    per file. Returns None if ffprobe fails.
+    """
+    if use_cache:
+        frame_count: int | None = load_source_cache(media_filepath, "frame_count")
+        if frame_count is not None:
+            return frame_count
 
-def extract_media_info(media_filepath: str) -> MediaInfo:
+    ffprobe_command = [
+        ffprobe_exe,
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-count_packets",
+        "-show_entries", "stream=nb_read_packets",
+        "-of", "csv=p=0",
+        media_filepath
+    ]
+    process = subprocess.run(ffprobe_command, stdout=subprocess.PIPE)
+    try:
+        frame_count = int(process.stdout.decode('utf-8').strip().split(',')[0])
+    except ValueError:
+        return None
+    save_source_cache(media_filepath, "frame_count", frame_count)
+    return frame_count
+
+
+
+def extract_media_info(media_filepath: str, exact_frame_count: bool = True) -> MediaInfo:
     media_info = get_media_info(media_filepath)
     duration_s = float(media_info['format']['duration'])
 
@@ -172,7 +264,12 @@ def extract_media_info(media_filepath: str) -> MediaInfo:
         'color_matrix': v_stream.get('color_matrix', 'unknown'),
         'color_transfer': v_stream.get('color_transfer', 'unknown'),
         'color_primaries': v_stream.get('color_primaries', 'unknown'),
-        'color_range': v_stream.get('color_range', 'limited'),
+        # None: not tagged, the vs script reads the range from the frame props
+        'color_range': (
+            v_stream['color_range']
+            if v_stream.get('color_range', 'unknown') not in ('unknown', 'unspecified')
+            else None
+        ),
 
         'duration': duration_s,
         'metadata': v_stream.get('tags', None),
@@ -230,16 +327,36 @@ def extract_media_info(media_filepath: str) -> MediaInfo:
         + 0.5
     )
 
+    video_info['frame_count_exact'] = False
+
     tags = v_stream.get('tags', None)
     if tags is not None:
         tag_frame_count = tags.get('NUMBER_OF_FRAMES', None)
         if tag_frame_count is not None:
             tag_frame_count = int(tag_frame_count)
+            video_info['frame_count_exact'] = True
             if video_info['frame_count'] != tag_frame_count:
                 video_info['frame_count'] = tag_frame_count
                 video_info['frame_rate_r'] = tag_frame_count / video_info['duration']
                 video_info['avg_frame_rate'] = video_info['frame_rate_r']
 
+    if not video_info['frame_count_exact']:
+        # Nb of frames stored in the container index (e.g. mp4, mov)
+        try:
+            nb_frames = int(v_stream.get('nb_frames', 0))
+        except ValueError:
+            nb_frames = 0
+        if nb_frames > 0:
+            video_info['frame_count'] = nb_frames
+            video_info['frame_count_exact'] = True
+
+    if not video_info['frame_count_exact'] and exact_frame_count:
+        # VFR, ts, ...: count the packets
+        frame_count = count_video_frames(media_filepath)
+        if frame_count is not None and frame_count > 0:
+            video_info['frame_count'] = frame_count
+            video_info['frame_count_exact'] = True
+
     return MediaInfo(
         video=video_info,
         audio=audio_info,
@@ -0,0 +1,265 @@
+"""NumPy reference implementation of the spatial stages of vs_temporalfix.
+Works on planes (2D arrays of unsigned integers) and reproduces the rounding,
+the clamping and the edge handling of the VapourSynth filters, so that the
+outputs can be compared pixel by pixel (vstf_np_stages.py --mode parity).
+Implemented: std.BoxBlur, std.Convolution (3x3), std.Median, std.Maximum,
+ctmf.CTMF, std.MakeDiff, std.MergeDiff, std.Levels (gamma = 1), std.Invert,
+std.MaskedMerge, and the expressions of TweakDarks, MinBlur, ContraSharpening
+and of the masks.
+Not implemented: rgvs.Repair, tcanny, mvtools: their outputs are inputs of
+these functions.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+MAT_RG11: tuple[int] = (1, 2, 1, 2, 4, 2, 1, 2, 1)
+MAT_BOX: tuple[int] = (1, 1, 1, 1, 1, 1, 1, 1, 1)
+
+
+def _peak(bits: int) -> int:
+    return (1 << bits) - 1
+
+
+def _mid(bits: int) -> int:
+    return 1 << (bits - 1)
+
+
+def _dtype(bits: int) -> np.dtype:
+    return np.dtype(np.uint8 if bits <= 8 else np.uint16)
+
+
+def _expr_output(values: np.ndarray, bits: int) -> np.ndarray:
+    """Conversion of the float result of std.Expr to an integer format"""
+    return np.clip(np.rint(values), 0, _peak(bits)).astype(_dtype(bits))
+
+
+def _windows(plane: np.ndarray, radius: int, mode: str) -> np.ndarray:
+    """Returns the (2 * radius + 1)^2 neighbours of each pixel, last axis.
+    mode: 'reflect' for the std filters (the edge pixel is not repeated),
+    'edge' for ctmf.
+    """
+    size: int = 2 * radius + 1
+    padded = np.pad(plane, radius, mode=mode)
+    return sliding_window_view(padded, (size, size)).reshape(*plane.shape, size * size)
+
+
+# Filters
+
+def box_blur_1d(plane: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """One pass of std.BoxBlur: the edge pixels are repeated, the sum is rounded"""
+    if radius <= 0:
+        return plane
+    size: int = 2 * radius + 1
+    n: int = plane.shape[axis]
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius + 1, radius)
+    acc = np.cumsum(np.pad(plane.astype(np.int64), pad, mode='edge'), axis=axis)
+    if axis == 0:
+        sums = acc[size:size + n] - acc[:n]
+    else:
+        sums = acc[:, size:size + n] - acc[:, :n]
+    return ((sums + radius) // size).astype(plane.dtype)
+
+
+def box_blur(
+    plane: np.ndarray,
+    hradius: int,
+    hpasses: int = 1,
+    vradius: int | None = None,
+    vpasses: int | None = None,
+) -> np.ndarray:
+    vradius = hradius if vradius is None else vradius
+    vpasses = hpasses if vpasses is None else vpasses
+    for _ in range(hpasses):
+        plane = box_blur_1d(plane, hradius, axis=1)
+    for _ in range(vpasses):
+        plane = box_blur_1d(plane, vradius, axis=0)
+    return plane
+
+
+def convolution(plane: np.ndarray, matrix: tuple[int] = MAT_RG11) -> np.ndarray:
+    """std.Convolution, 3x3 matrix, default divisor (sum of the matrix)"""
+    div: int = sum(matrix)
+    sums = _windows(plane.astype(np.int64), 1, 'reflect') @ np.array(matrix, dtype=np.int64)
+    # round half up, as the float computation of the filter
+    out = (2 * sums + div) // (2 * div)
+    return np.clip(out, 0, np.iinfo(plane.dtype).max).astype(plane.dtype)
+
+
+def median(plane: np.ndarray) -> np.ndarray:
+    """std.Median: 3x3"""
+    return np.partition(_windows(plane, 1, 'reflect'), 4, axis=-1)[..., 4]
+
+
+def maximum(plane: np.ndarray) -> np.ndarray:
+    """std.Maximum: 3x3, no threshold"""
+    return _windows(plane, 1, 'reflect').max(axis=-1)
+
+
+def ctmf(plane: np.ndarray, radius: int = 2) -> np.ndarray:
+    """ctmf.CTMF: median of a (2 * radius + 1)^2 window"""
+    size: int = (2 * radius + 1) ** 2
+    return np.partition(_windows(plane, radius, 'edge'), size // 2, axis=-1)[..., size // 2]
+
+
+def make_diff(x: np.ndarray, y: np.ndarray, bits: int = 16) -> np.ndarray:
+    out = x.astype(np.int64) - y + _mid(bits)
+    return np.clip(out, 0, _peak(bits)).astype(_dtype(bits))
+
+
+def merge_diff(x: np.ndarray, y: np.ndarray, bits: int = 16) -> np.ndarray:
+    out = x.astype(np.int64) + y - _mid(bits)
+    return np.clip(out, 0, _peak(bits)).astype(_dtype(bits))
+
+
+def levels(
+    plane: np.ndarray,
+    min_in: int = 0,
+    max_in: int | None = None,
+    min_out: int = 0,
+    max_out: int | None = None,
+    bits: int = 16,
+) -> np.ndarray:
+    """std.Levels, gamma = 1: the expression of FusedExpr.levels"""
+    f32 = np.float32
+    max_in = _peak(bits) if max_in is None else max_in
+    max_out = _peak(bits) if max_out is None else max_out
+    range_in = f32(max_in - min_in)
+    x = np.clip(plane.astype(f32) - f32(min_in), f32(0), range_in)
+    x = x / range_in * f32(max_out - min_out) + f32(min_out) + f32(0.5)
+    return np.clip(np.floor(x), 0, _peak(bits)).astype(_dtype(bits))
+
+
+def invert(plane: np.ndarray, bits: int = 16) -> np.ndarray:
+    return (_peak(bits) - plane.astype(np.int64)).astype(_dtype(bits))
+
+
+def masked_merge(
+    x: np.ndarray,
+    y: np.ndarray,
+    mask: np.ndarray,
+    bits: int = 16,
+) -> np.ndarray:
+    """std.MaskedMerge: y where the mask is at its peak"""
+    peak: int = _peak(bits)
+    m = mask.astype(np.int64)
+    out = (x.astype(np.int64) * (peak - m) + y.astype(np.int64) * m + peak // 2) // peak
+    return out.astype(_dtype(bits))
+
+
+# Stages of vs_temporalfix
+
+def tweak_darks(
+    plane: np.ndarray,
+    s0: float = 2.0,
+    c: float = 0.0625,
+    bits: int = 16,
+) -> np.ndarray:
+    """TweakDarks, luma plane: the chroma planes are not modified"""
+    f32 = np.float32
+    i = 1 << (bits - 8)
+    k = (s0 - 1) * c
+    c1 = 1 + c
+    c2 = c1 * c
+    x = plane.astype(f32)
+    if bits != 8:
+        x = x / f32(i)
+    t = np.clip(x / f32(255), f32(0), f32(1))
+    e = f32(k) * (f32(c1) - f32(c2) / (t + f32(c))) + t * (f32(1) - f32(k))
+    return _expr_output(e * f32(256 * i), bits)
+
+
+def average_color_fix(
+    plane: np.ndarray,
+    ref: np.ndarray,
+    radius: int = 4,
+    passes: int = 4,
+    bits: int = 16,
+) -> np.ndarray:
+    """AverageColorFix: low frequencies of ref, high frequencies of plane"""
+    diff = make_diff(box_blur(ref, radius, passes), box_blur(plane, radius, passes), bits)
+    return merge_diff(plane, diff, bits)
+
+
+def frequency_merge(
+    low: np.ndarray,
+    high: np.ndarray,
+    radius: int = 40,
+    passes: int = 3,
+    bits: int = 16,
+) -> np.ndarray:
+    high_remaining = make_diff(high, box_blur(high, radius, passes), bits)
+    return merge_diff(box_blur(low, radius, passes), high_remaining, bits)
+
+
+def min_blur(plane: np.ndarray, radius: int = 2) -> np.ndarray:
+    """MinBlur: the blur (gaussian or median) which is the closest to the
+    source, the source where they are on opposite sides
+    """
+    x = plane.astype(np.int64)
+    rg11 = convolution(convolution(plane, MAT_RG11), MAT_BOX).astype(np.int64)
+    rg4 = ctmf(plane, radius).astype(np.int64)
+    closest = np.where(np.abs(x - rg11) < np.abs(x - rg4), rg11, rg4)
+    return np.where((x - rg11) * (x - rg4) < 0, x, closest).astype(plane.dtype)
+
+
+def contra_sharpening_diff(
+    plane: np.ndarray,
+    minblur_radius: int = 2,
+    bits: int = 16,
+) -> np.ndarray:
+    """Difference of a simple kernel blur of the MinBlur clip: ssD of
+    ContraSharpening, before it is limited by rgvs.Repair
+    """
+    s = min_blur(plane, minblur_radius)
+    rg11 = convolution(convolution(s, MAT_RG11), MAT_BOX)
+    return make_diff(s, rg11, bits)
+
+
+def contra_sharpening_limit(
+    plane: np.ndarray,
+    repaired: np.ndarray,
+    diff: np.ndarray,
+    bits: int = 16,
+) -> np.ndarray:
+    """Last expression of ContraSharpening: the repaired difference is used
+    where it is smaller than the blur difference, then applied
+    """
+    mid: int = _mid(bits)
+    ssdd = repaired.astype(np.int64)
+    ssd = diff.astype(np.int64)
+    limited = np.where(np.abs(ssdd - mid) < np.abs(ssd - mid), ssdd, ssd)
+    return np.clip(plane.astype(np.int64) + limited - mid, 0, _peak(bits)).astype(_dtype(bits))
+
+
+def motion_mask_fade(
+    mm: np.ndarray,
+    m1: np.ndarray,
+    m2: np.ndarray,
+    m3: np.ndarray,
+    p1: np.ndarray,
+    p2: np.ndarray,
+    bits: int = 16,
+) -> np.ndarray:
+    """Expression which fades the motion mask in and out with the shifted masks"""
+    f32 = np.float32
+    e = mm.astype(f32) + m1.astype(f32)
+    e = e + m2.astype(f32) * f32(0.75)
+    e = e + m3.astype(f32) * f32(0.5)
+    e = e + p1.astype(f32) * f32(0.75)
+    e = e + p2.astype(f32) * f32(0.5)
+    return _expr_output(e, bits)
+
+
+def flat_mask_diff(
+    texture_post: np.ndarray,
+    texture_pre: np.ndarray,
+    bits: int = 16,
+) -> np.ndarray:
+    """Mask of the flat areas where textures appeared: texture_post is the
+    inverted texture mask of the output, texture_pre the texture mask of
+    the source
+    """
+    diff = make_diff(texture_post, invert(texture_pre, bits), bits)
+    return levels(diff, max_in=_mid(bits), max_out=_peak(bits), bits=bits)
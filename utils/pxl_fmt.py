@@ -1,4 +1,7 @@
+import os
 import re
+from types import MappingProxyType
+import zlib
 from .p_print import *
 
 
@@ -72,8 +75,8 @@ IO... yuv422p10be            3             20      10-10-10
 IO... yuv422p10le            3             20      10-10-10
 IO... yuv444p9be             3             27      9-9-9
 IO... yuv444p9le             3             27      9-9-9
-IO... yuv444p10be            3             48      10-10-10
-IO... yuv444p10le            3             48      10-10-10
+IO... yuv444p10be            3             30      10-10-10
+IO... yuv444p10le            3             30      10-10-10
 IO... yuv422p9be             3             18      9-9-9
 IO... yuv422p9le             3             18      9-9-9
 IO... gbrp                   3             24      8-8-8
@@ -235,13 +238,16 @@ IO... gbrap14le              4             56      14-14-14-14
 ..H.. d3d12                  0              0      0
 """
 
-_pixel_formats: dict[str, dict[str, int | bool]] = {}
-if (formats := re.findall(
+def _parse_pixel_formats() -> dict[str, dict[str, int | str | bool]]:
+    """Returns the pixel format table parsed from the ffmpeg -pix_fmts output"""
+    pixel_formats: dict[str, dict[str, int | str | bool]] = {}
+    formats: list[str, str, str, str] = re.findall(
         re.compile(r"[IOHBP.]{5}\s+([a-z_\d]+)\s+([1234]{1})\s+(\d+)\s+([\d-]+)"),
         ffmpeg_pixl_fmts
     )
-):
-    formats: list[str, str, str, str]
+    if not formats:
+        raise ValueError(red("Failed extracting pixel format"))
+
     for f in formats:
         k, nc, bpp, bit_depths = f
         c_order: str = ''
@@ -263,15 +269,45 @@ if (formats := re.findall(
             c_order = 'gray'
 
         storage_bpp = max(list(map(int, bit_depths.split('-'))))
-        _pixel_formats[k] = {
+        # Samples of 9 to 15 bits are stored as 16-bit words in the pipe
+        pipe_bpp: int = int(bpp)
+        if 8 < storage_bpp < 16:
+            pipe_bpp = int(round(4 * int(bpp) / storage_bpp) * 16 / 4)
+        pixel_formats[k] = {
             'c': int(nc),
             'bpp': storage_bpp,
-            'pipe_bpp': int(bpp),
+            'pipe_bpp': pipe_bpp,
             'c_order': c_order,
             'supported': True if c_order in ('rgb', 'bgr', 'gbr', 'yuv') else False,
         }
-else:
-    raise ValueError(red("Failed extracting pixel format"))
+    return pixel_formats
+
+
+def write_pixel_format_table() -> str:
+    """Generates the precomputed table module, returns its path"""
+    table_fp: str = os.path.join(os.path.dirname(__file__), "pxl_fmt_table.py")
+    with open(table_fp, mode='w') as table_file:
+        table_file.write(
+            "# Generated by: python -m utils.pxl_fmt. Do not edit.\n"
+            f"SOURCE_CRC: int = {zlib.crc32(ffmpeg_pixl_fmts.encode())}\n"
+            "PIXEL_FORMAT_TABLE: dict[str, dict[str, int | str | bool]] = {\n"
+        )
+        for k, v in _parse_pixel_formats().items():
+            table_file.write(f"    {k!r}: {v!r},\n")
+        table_file.write("}\n")
+    return table_fp
+
+
+# Use the precomputed table unless the ffmpeg output has been modified.
+# The table is only written by `python -m utils.pxl_fmt`: otherwise it is
+# parsed in memory
+try:
+    from .pxl_fmt_table import PIXEL_FORMAT_TABLE, SOURCE_CRC
+    if SOURCE_CRC != zlib.crc32(ffmpeg_pixl_fmts.encode()):
+        raise ImportError
+    _pixel_formats = PIXEL_FORMAT_TABLE
+except ImportError:
+    _pixel_formats = _parse_pixel_formats()
 
 # Debug
 # for k, v in _pixel_formats.items():
@@ -280,4 +316,91 @@ else:
 #     else:
 #         print(lightgrey(k))
 
-PIXEL_FORMAT = _pixel_formats
+PIXEL_FORMAT: MappingProxyType = MappingProxyType(_pixel_formats)
+
+
+# Packed/semi-planar formats cannot be outputed by vspipe: use the planar
+# format which has the same subsampling and bit depth. FFmpeg then only
+# (re)packs the samples, no scaling nor dithering.
+# The yuvj formats are not mapped: they are full range, the script outputs
+# them as is so that FFmpeg does not convert the range.
+_planar_pix_fmt: dict[str, str] = {
+    'nv12': 'yuv420p',
+    'nv21': 'yuv420p',
+    'p010le': 'yuv420p10le',
+    'p012le': 'yuv420p12le',
+    'p016le': 'yuv420p16le',
+    'nv16': 'yuv422p',
+    'yuyv422': 'yuv422p',
+    'uyvy422': 'yuv422p',
+    'yvyu422': 'yuv422p',
+    'nv20le': 'yuv422p10le',
+    'y210le': 'yuv422p10le',
+    'p210le': 'yuv422p10le',
+    'y212le': 'yuv422p12le',
+    'p212le': 'yuv422p12le',
+    'p216le': 'yuv422p16le',
+    'nv24': 'yuv444p',
+    'nv42': 'yuv444p',
+    'p410le': 'yuv444p10le',
+    'p412le': 'yuv444p12le',
+    'p416le': 'yuv444p16le',
+    'rgb24': 'gbrp',
+    'bgr24': 'gbrp',
+    '0rgb': 'gbrp',
+    'rgb0': 'gbrp',
+    '0bgr': 'gbrp',
+    'bgr0': 'gbrp',
+    'x2rgb10le': 'gbrp10le',
+    'x2bgr10le': 'gbrp10le',
+    'rgb48le': 'gbrp16le',
+    'bgr48le': 'gbrp16le',
+}
+
+_chroma_subsampling: dict[str, tuple[int, int]] = {
+    '444': (0, 0),
+    '422': (1, 0),
+    '420': (1, 1),
+    '440': (0, 1),
+    '411': (2, 0),
+    '410': (2, 2),
+}
+
+
+def get_pipe_pix_fmt(pix_fmt: str) -> str:
+    """Returns the planar pixel format sent through the pipe to the encoder
+    so that the encoder does not have to convert it
+    """
+    pipe_pix_fmt: str = _planar_pix_fmt.get(pix_fmt, pix_fmt)
+    if pix_fmt_to_vs_format(pipe_pix_fmt) is None:
+        raise ValueError(red(f"{pix_fmt} cannot be generated by the script"))
+    return pipe_pix_fmt
+
+
+def pix_fmt_to_vs_format(pix_fmt: str) -> tuple[str, int, int, int] | None:
+    """Returns the color family, the bit depth and the horizontal and
+    vertical chroma subsampling of a planar pixel format.
+    These are the arguments of vs.core.query_video_format.
+    Returns None if this is not a planar integer format.
+    """
+    if (re_match := re.match(
+        re.compile(r"^(yuvj?|gbr|gray)(4[1-4][0-4])?p?(\d{1,2})?(le)?$"),
+        pix_fmt
+    )) is None:
+        return None
+    family, subsampling, bit_depth, _ = re_match.groups()
+    bit_depth = int(bit_depth) if bit_depth is not None else 8
+    if bit_depth > 16:
+        return None
+
+    if family in ('yuv', 'yuvj'):
+        if subsampling not in _chroma_subsampling:
+            return None
+        return ('yuv', bit_depth, *_chroma_subsampling[subsampling])
+    elif subsampling is not None:
+        return None
+    return ('rgb' if family == 'gbr' else 'gray', bit_depth, 0, 0)
+
+
+if __name__ == "__main__":
+    print(f"Generated: {write_pixel_format_table()}")
@@ -0,0 +1,218 @@
+# Generated by: python -m utils.pxl_fmt. Do not edit.
+SOURCE_CRC: int = 961000256
+PIXEL_FORMAT_TABLE: dict[str, dict[str, int | str | bool]] = {
+    'yuv420p': {'c': 3, 'bpp': 8, 'pipe_bpp': 12, 'c_order': 'yuv', 'supported': True},
+    'yuyv422': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'rgb24': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'rgb', 'supported': True},
+    'bgr24': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'bgr', 'supported': True},
+    'yuv422p': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': 'yuv', 'supported': True},
+    'yuv444p': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'yuv', 'supported': True},
+    'yuv410p': {'c': 3, 'bpp': 8, 'pipe_bpp': 9, 'c_order': 'yuv', 'supported': True},
+    'yuv411p': {'c': 3, 'bpp': 8, 'pipe_bpp': 12, 'c_order': 'yuv', 'supported': True},
+    'gray': {'c': 1, 'bpp': 8, 'pipe_bpp': 8, 'c_order': '', 'supported': False},
+    'monow': {'c': 1, 'bpp': 1, 'pipe_bpp': 1, 'c_order': '', 'supported': False},
+    'monob': {'c': 1, 'bpp': 1, 'pipe_bpp': 1, 'c_order': '', 'supported': False},
+    'pal8': {'c': 1, 'bpp': 8, 'pipe_bpp': 8, 'c_order': '', 'supported': False},
+    'yuvj420p': {'c': 3, 'bpp': 8, 'pipe_bpp': 12, 'c_order': 'yuv', 'supported': True},
+    'yuvj422p': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': 'yuv', 'supported': True},
+    'yuvj444p': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'yuv', 'supported': True},
+    'uyvy422': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'uyyvyy411': {'c': 3, 'bpp': 8, 'pipe_bpp': 12, 'c_order': '', 'supported': False},
+    'bgr8': {'c': 3, 'bpp': 3, 'pipe_bpp': 8, 'c_order': 'bgr', 'supported': True},
+    'bgr4': {'c': 3, 'bpp': 2, 'pipe_bpp': 4, 'c_order': 'bgr', 'supported': True},
+    'bgr4_byte': {'c': 3, 'bpp': 2, 'pipe_bpp': 4, 'c_order': 'bgr', 'supported': True},
+    'rgb8': {'c': 3, 'bpp': 3, 'pipe_bpp': 8, 'c_order': 'rgb', 'supported': True},
+    'rgb4': {'c': 3, 'bpp': 2, 'pipe_bpp': 4, 'c_order': 'rgb', 'supported': True},
+    'rgb4_byte': {'c': 3, 'bpp': 2, 'pipe_bpp': 4, 'c_order': 'rgb', 'supported': True},
+    'nv12': {'c': 3, 'bpp': 8, 'pipe_bpp': 12, 'c_order': '', 'supported': False},
+    'nv21': {'c': 3, 'bpp': 8, 'pipe_bpp': 12, 'c_order': '', 'supported': False},
+    'argb': {'c': 4, 'bpp': 8, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'rgba': {'c': 4, 'bpp': 8, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'abgr': {'c': 4, 'bpp': 8, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'bgra': {'c': 4, 'bpp': 8, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'gray16be': {'c': 1, 'bpp': 16, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'gray16le': {'c': 1, 'bpp': 16, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'yuv440p': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': 'yuv', 'supported': True},
+    'yuvj440p': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': 'yuv', 'supported': True},
+    'yuva420p': {'c': 4, 'bpp': 8, 'pipe_bpp': 20, 'c_order': '', 'supported': False},
+    'rgb48be': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'rgb48le': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': 'rgb', 'supported': True},
+    'rgb565be': {'c': 3, 'bpp': 6, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'rgb565le': {'c': 3, 'bpp': 6, 'pipe_bpp': 16, 'c_order': 'rgb', 'supported': True},
+    'rgb555be': {'c': 3, 'bpp': 5, 'pipe_bpp': 15, 'c_order': '', 'supported': False},
+    'rgb555le': {'c': 3, 'bpp': 5, 'pipe_bpp': 15, 'c_order': 'rgb', 'supported': True},
+    'bgr565be': {'c': 3, 'bpp': 6, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bgr565le': {'c': 3, 'bpp': 6, 'pipe_bpp': 16, 'c_order': 'bgr', 'supported': True},
+    'bgr555be': {'c': 3, 'bpp': 5, 'pipe_bpp': 15, 'c_order': '', 'supported': False},
+    'bgr555le': {'c': 3, 'bpp': 5, 'pipe_bpp': 15, 'c_order': 'bgr', 'supported': True},
+    'yuv420p16le': {'c': 3, 'bpp': 16, 'pipe_bpp': 24, 'c_order': 'yuv', 'supported': True},
+    'yuv420p16be': {'c': 3, 'bpp': 16, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'yuv422p16le': {'c': 3, 'bpp': 16, 'pipe_bpp': 32, 'c_order': 'yuv', 'supported': True},
+    'yuv422p16be': {'c': 3, 'bpp': 16, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuv444p16le': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': 'yuv', 'supported': True},
+    'yuv444p16be': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'rgb444le': {'c': 3, 'bpp': 4, 'pipe_bpp': 12, 'c_order': 'rgb', 'supported': True},
+    'rgb444be': {'c': 3, 'bpp': 4, 'pipe_bpp': 12, 'c_order': '', 'supported': False},
+    'bgr444le': {'c': 3, 'bpp': 4, 'pipe_bpp': 12, 'c_order': 'bgr', 'supported': True},
+    'bgr444be': {'c': 3, 'bpp': 4, 'pipe_bpp': 12, 'c_order': '', 'supported': False},
+    'ya8': {'c': 2, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bgr48be': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'bgr48le': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': 'bgr', 'supported': True},
+    'yuv420p9be': {'c': 3, 'bpp': 9, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'yuv420p9le': {'c': 3, 'bpp': 9, 'pipe_bpp': 24, 'c_order': 'yuv', 'supported': True},
+    'yuv420p10be': {'c': 3, 'bpp': 10, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'yuv420p10le': {'c': 3, 'bpp': 10, 'pipe_bpp': 24, 'c_order': 'yuv', 'supported': True},
+    'yuv422p10be': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuv422p10le': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': 'yuv', 'supported': True},
+    'yuv444p9be': {'c': 3, 'bpp': 9, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuv444p9le': {'c': 3, 'bpp': 9, 'pipe_bpp': 48, 'c_order': 'yuv', 'supported': True},
+    'yuv444p10be': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuv444p10le': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': 'yuv', 'supported': True},
+    'yuv422p9be': {'c': 3, 'bpp': 9, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuv422p9le': {'c': 3, 'bpp': 9, 'pipe_bpp': 32, 'c_order': 'yuv', 'supported': True},
+    'gbrp': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'gbr', 'supported': True},
+    'gbrp9be': {'c': 3, 'bpp': 9, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'gbrp9le': {'c': 3, 'bpp': 9, 'pipe_bpp': 48, 'c_order': 'gbr', 'supported': True},
+    'gbrp10be': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'gbrp10le': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': 'gbr', 'supported': True},
+    'gbrp16be': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'gbrp16le': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': 'gbr', 'supported': True},
+    'yuva422p': {'c': 4, 'bpp': 8, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'yuva444p': {'c': 4, 'bpp': 8, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuva420p9be': {'c': 4, 'bpp': 9, 'pipe_bpp': 40, 'c_order': '', 'supported': False},
+    'yuva420p9le': {'c': 4, 'bpp': 9, 'pipe_bpp': 40, 'c_order': '', 'supported': False},
+    'yuva422p9be': {'c': 4, 'bpp': 9, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva422p9le': {'c': 4, 'bpp': 9, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva444p9be': {'c': 4, 'bpp': 9, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'yuva444p9le': {'c': 4, 'bpp': 9, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'yuva420p10be': {'c': 4, 'bpp': 10, 'pipe_bpp': 40, 'c_order': '', 'supported': False},
+    'yuva420p10le': {'c': 4, 'bpp': 10, 'pipe_bpp': 40, 'c_order': '', 'supported': False},
+    'yuva422p10be': {'c': 4, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva422p10le': {'c': 4, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva444p10be': {'c': 4, 'bpp': 10, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'yuva444p10le': {'c': 4, 'bpp': 10, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'yuva420p16be': {'c': 4, 'bpp': 16, 'pipe_bpp': 40, 'c_order': '', 'supported': False},
+    'yuva420p16le': {'c': 4, 'bpp': 16, 'pipe_bpp': 40, 'c_order': '', 'supported': False},
+    'yuva422p16be': {'c': 4, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva422p16le': {'c': 4, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva444p16be': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'yuva444p16le': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'xyz12le': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'xyz12be': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'nv16': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'nv20le': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'nv20be': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'rgba64be': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'rgba64le': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'bgra64be': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'bgra64le': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'yvyu422': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'ya16be': {'c': 2, 'bpp': 16, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'ya16le': {'c': 2, 'bpp': 16, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'gbrap': {'c': 4, 'bpp': 8, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'gbrap16be': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'gbrap16le': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    '0rgb': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'rgb', 'supported': True},
+    'rgb0': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'rgb', 'supported': True},
+    '0bgr': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'bgr', 'supported': True},
+    'bgr0': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': 'bgr', 'supported': True},
+    'yuv420p12be': {'c': 3, 'bpp': 12, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'yuv420p12le': {'c': 3, 'bpp': 12, 'pipe_bpp': 24, 'c_order': 'yuv', 'supported': True},
+    'yuv420p14be': {'c': 3, 'bpp': 14, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'yuv420p14le': {'c': 3, 'bpp': 14, 'pipe_bpp': 24, 'c_order': 'yuv', 'supported': True},
+    'yuv422p12be': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuv422p12le': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': 'yuv', 'supported': True},
+    'yuv422p14be': {'c': 3, 'bpp': 14, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuv422p14le': {'c': 3, 'bpp': 14, 'pipe_bpp': 32, 'c_order': 'yuv', 'supported': True},
+    'yuv444p12be': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuv444p12le': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': 'yuv', 'supported': True},
+    'yuv444p14be': {'c': 3, 'bpp': 14, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuv444p14le': {'c': 3, 'bpp': 14, 'pipe_bpp': 48, 'c_order': 'yuv', 'supported': True},
+    'gbrp12be': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'gbrp12le': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': 'gbr', 'supported': True},
+    'gbrp14be': {'c': 3, 'bpp': 14, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'gbrp14le': {'c': 3, 'bpp': 14, 'pipe_bpp': 48, 'c_order': 'gbr', 'supported': True},
+    'yuvj411p': {'c': 3, 'bpp': 8, 'pipe_bpp': 12, 'c_order': 'yuv', 'supported': True},
+    'bayer_bggr8': {'c': 3, 'bpp': 4, 'pipe_bpp': 8, 'c_order': '', 'supported': False},
+    'bayer_rggb8': {'c': 3, 'bpp': 4, 'pipe_bpp': 8, 'c_order': '', 'supported': False},
+    'bayer_gbrg8': {'c': 3, 'bpp': 4, 'pipe_bpp': 8, 'c_order': '', 'supported': False},
+    'bayer_grbg8': {'c': 3, 'bpp': 4, 'pipe_bpp': 8, 'c_order': '', 'supported': False},
+    'bayer_bggr16le': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bayer_bggr16be': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bayer_rggb16le': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bayer_rggb16be': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bayer_gbrg16le': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bayer_gbrg16be': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bayer_grbg16le': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'bayer_grbg16be': {'c': 3, 'bpp': 8, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'yuv440p10le': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': 'yuv', 'supported': True},
+    'yuv440p10be': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuv440p12le': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': 'yuv', 'supported': True},
+    'yuv440p12be': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'ayuv64le': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'ayuv64be': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'p010le': {'c': 3, 'bpp': 10, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'p010be': {'c': 3, 'bpp': 10, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'gbrap12be': {'c': 4, 'bpp': 12, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'gbrap12le': {'c': 4, 'bpp': 12, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'gbrap10be': {'c': 4, 'bpp': 10, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'gbrap10le': {'c': 4, 'bpp': 10, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'gray12be': {'c': 1, 'bpp': 12, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'gray12le': {'c': 1, 'bpp': 12, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'gray10be': {'c': 1, 'bpp': 10, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'gray10le': {'c': 1, 'bpp': 10, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'p016le': {'c': 3, 'bpp': 16, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'p016be': {'c': 3, 'bpp': 16, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'gray9be': {'c': 1, 'bpp': 9, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'gray9le': {'c': 1, 'bpp': 9, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'gbrpf32be': {'c': 3, 'bpp': 32, 'pipe_bpp': 96, 'c_order': '', 'supported': False},
+    'gbrpf32le': {'c': 3, 'bpp': 32, 'pipe_bpp': 96, 'c_order': 'gbr', 'supported': True},
+    'gbrapf32be': {'c': 4, 'bpp': 32, 'pipe_bpp': 128, 'c_order': '', 'supported': False},
+    'gbrapf32le': {'c': 4, 'bpp': 32, 'pipe_bpp': 128, 'c_order': '', 'supported': False},
+    'gray14be': {'c': 1, 'bpp': 14, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'gray14le': {'c': 1, 'bpp': 14, 'pipe_bpp': 16, 'c_order': '', 'supported': False},
+    'grayf32be': {'c': 1, 'bpp': 32, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'grayf32le': {'c': 1, 'bpp': 32, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'yuva422p12be': {'c': 4, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva422p12le': {'c': 4, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'yuva444p12be': {'c': 4, 'bpp': 12, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'yuva444p12le': {'c': 4, 'bpp': 12, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'nv24': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'nv42': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'y210be': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'y210le': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'x2rgb10le': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': 'rgb', 'supported': True},
+    'x2rgb10be': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'x2bgr10le': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': 'bgr', 'supported': True},
+    'x2bgr10be': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'p210be': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'p210le': {'c': 3, 'bpp': 10, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'p410be': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'p410le': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'p216be': {'c': 3, 'bpp': 16, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'p216le': {'c': 3, 'bpp': 16, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'p416be': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'p416le': {'c': 3, 'bpp': 16, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'vuya': {'c': 4, 'bpp': 8, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'rgbaf16be': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'rgbaf16le': {'c': 4, 'bpp': 16, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'vuyx': {'c': 3, 'bpp': 8, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'p012le': {'c': 3, 'bpp': 12, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'p012be': {'c': 3, 'bpp': 12, 'pipe_bpp': 24, 'c_order': '', 'supported': False},
+    'y212be': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'y212le': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'xv30be': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'xv30le': {'c': 3, 'bpp': 10, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'xv36be': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'xv36le': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'rgbf32be': {'c': 3, 'bpp': 32, 'pipe_bpp': 96, 'c_order': '', 'supported': False},
+    'rgbf32le': {'c': 3, 'bpp': 32, 'pipe_bpp': 96, 'c_order': 'rgb', 'supported': True},
+    'rgbaf32be': {'c': 4, 'bpp': 32, 'pipe_bpp': 128, 'c_order': '', 'supported': False},
+    'rgbaf32le': {'c': 4, 'bpp': 32, 'pipe_bpp': 128, 'c_order': '', 'supported': False},
+    'p212be': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'p212le': {'c': 3, 'bpp': 12, 'pipe_bpp': 32, 'c_order': '', 'supported': False},
+    'p412be': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'p412le': {'c': 3, 'bpp': 12, 'pipe_bpp': 48, 'c_order': '', 'supported': False},
+    'gbrap14be': {'c': 4, 'bpp': 14, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+    'gbrap14le': {'c': 4, 'bpp': 14, 'pipe_bpp': 64, 'c_order': '', 'supported': False},
+}
@@ -0,0 +1,51 @@
+import json
+import os
+from typing import Any
+
+from .path_utils import get_app_tempdir
+
+
+def get_cache_dir() -> str:
+    return os.path.join(get_app_tempdir(), "cache")
+
+
+def source_cache_key(fp: str) -> str:
+    """Returns a key which identifies a source file: its path, size
+    and modification time, so that an edited file gets a new key.
+    """
+    import hashlib
+
+    fp = os.path.abspath(fp)
+    stat = os.stat(fp)
+    return hashlib.sha1(
+        f"{fp}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")
+    ).hexdigest()
+
+
+def source_cache_path(fp: str, name: str) -> str:
+    """Returns the path of the cache file of a source"""
+    return os.path.join(get_cache_dir(), f"{source_cache_key(fp)}_{name}.json")
+
+
+def load_source_cache(fp: str, name: str) -> Any | None:
+    """Returns the data previously saved for this source,
+    None if there is none or if the cache file is not valid.
+    """
+    try:
+        with open(source_cache_path(fp, name), mode='r') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_source_cache(fp: str, name: str, data: Any) -> None:
+    """Saves data for this source. Errors are ignored: the cache is optional"""
+    try:
+        os.makedirs(get_cache_dir(), exist_ok=True)
+        cache_path: str = source_cache_path(fp, name)
+        tmp_path: str = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode='w') as cache_file:
+            json.dump(data, cache_file)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
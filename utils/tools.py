@@ -11,11 +11,6 @@ external_dir: str = absolute_path(
     )
 )
 
-if not os.path.exists(external_dir):
-    os.makedirs(external_dir, exist_ok=True)
-if not os.path.exists(os.path.join(external_dir, "ffmpeg")):
-    os.makedirs(os.path.join(external_dir, "ffmpeg"), exist_ok=True)
-
 if sys.platform == "win32":
     ffmpeg_exe = os.path.join(external_dir, "ffmpeg", "ffmpeg.exe")
     ffprobe_exe = os.path.join(external_dir, "ffmpeg", "ffprobe.exe")
@@ -30,6 +25,22 @@ elif sys.platform == "linux":
 
     ffprobe_exe = absolute_path(ffprobe_exe)
     ffmpeg_exe = absolute_path(ffmpeg_exe)
+
+else:
+    sys.exit("[E] Platform/system not supported.")
+
+
+
+def prepare_external_dir() -> None:
+    """Creates the directories of the external tools"""
+    os.makedirs(os.path.join(external_dir, "ffmpeg"), exist_ok=True)
+
+
+
+def make_tools_executable() -> None:
+    """Sets the executable flag of ffmpeg and ffprobe (linux)"""
+    if sys.platform == "win32":
+        return
     try:
         for f in [ffmpeg_exe, ffprobe_exe]:
             st_mode = os.stat(f).st_mode
@@ -38,13 +49,12 @@ elif sys.platform == "linux":
     except:
         pass
 
-else:
-    sys.exit("[E] Platform/system not supported.")
-
 
 
 def check_missing_tools(tools: dict[str, str]) -> list[str]:
     """Returns the missing tools. ffmpeg and ffprobe are automatically checked."""
+    prepare_external_dir()
+    make_tools_executable()
     tools.update({
         'FFmpeg': ffmpeg_exe,
         'FFprobe': ffprobe_exe,
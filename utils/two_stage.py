@@ -0,0 +1,155 @@
+from copy import deepcopy
+from dataclasses import replace
+import os
+import subprocess
+import time
+
+from .encoder import (
+    generate_ffmpeg_encoder_cmd,
+    VideoEncoderParams,
+)
+from .logger import logger
+from .media import MediaInfo, VideoInfo
+from .p_print import red
+from .path_utils import get_extension
+from .source_cache import get_cache_dir, source_cache_key
+
+
+# Chunks shorter than this are not worth a separate encoder
+MIN_CHUNK_FRAMES: int = 250
+
+
+def get_intermediate_dir() -> str:
+    return os.path.join(get_cache_dir(), "intermediate")
+
+
+def intermediate_filepath(
+    in_media_path: str,
+    vs_args: list[str],
+    exclude_fp: str = "",
+    directory: str = "",
+) -> str:
+    """Returns the path of the intermediate file of a source filtered with
+    these vs script arguments. The arguments which do not modify the result
+    (threads) must not be in vs_args.
+    """
+    import hashlib
+
+    key: str = source_cache_key(in_media_path)
+    signature: list[str] = [key, *vs_args]
+    if exclude_fp:
+        with open(exclude_fp, mode='r') as exclude_file:
+            signature.append(exclude_file.read())
+    digest: str = hashlib.sha1("|".join(signature).encode("utf-8")).hexdigest()
+    directory = directory if directory else get_intermediate_dir()
+    return os.path.join(directory, f"{digest}.mkv")
+
+
+def split_chunks(
+    frame_count: int,
+    count: int,
+    min_frames: int = MIN_CHUNK_FRAMES,
+) -> list[tuple[int, int]]:
+    """Splits the frames into chunks of similar length.
+    Returns a list of (start, end), end excluded.
+    The intermediate file is intra only: every frame starts a GOP.
+    """
+    count = max(min(count, frame_count // min_frames), 1)
+    bounds: list[int] = [round(i * frame_count / count) for i in range(count + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _chunk_input_args(
+    intermediate_fp: str,
+    video_info: VideoInfo,
+    start: int,
+    end: int,
+) -> list[str]:
+    f_rate = video_info['frame_rate_r']
+    fps: float = f_rate[0] / f_rate[1] if isinstance(f_rate, tuple | list) else float(f_rate)
+    input_args: list[str] = []
+    if start > 0:
+        # Half a frame before: the container timestamps are rounded
+        input_args.extend(["-ss", f"{(start - 0.5) / fps:.6f}"])
+    input_args.extend(["-i", intermediate_fp, "-frames:v", str(end - start)])
+    return input_args
+
+
+def encode_chunks(
+    intermediate_fp: str,
+    chunks: list[tuple[int, int]],
+    video_info: VideoInfo,
+    params: VideoEncoderParams,
+    in_media_info: MediaInfo,
+    jobs: int,
+    chunk_dir: str,
+) -> list[str] | None:
+    """Encodes the chunks of the intermediate file, jobs at a time.
+    Returns the chunk files, None if an encoder failed.
+    """
+    os.makedirs(chunk_dir, exist_ok=True)
+    extension: str = get_extension(params.filepath)
+    chunk_fps: list[str] = []
+    commands: list[list[str]] = []
+    for i, (start, end) in enumerate(chunks):
+        chunk_fp: str = os.path.join(chunk_dir, f"chunk_{i:04d}{extension}")
+        chunk_fps.append(chunk_fp)
+        chunk_params: VideoEncoderParams = replace(
+            params,
+            filepath=chunk_fp,
+            copy_audio=False,
+            codec_settings=deepcopy(params.codec_settings),
+        )
+        command: list[str] = generate_ffmpeg_encoder_cmd(
+            video_info=video_info,
+            params=chunk_params,
+            in_media_info=in_media_info,
+            input_args=_chunk_input_args(intermediate_fp, video_info, start, end),
+        )
+        # Parallel encoders: no interleaved stats
+        commands.append([arg for arg in command if arg != "-stats"])
+        logger.debug(f"Chunk {i} [{start}, {end}[: {' '.join(commands[-1])}")
+
+    pending: list[int] = list(range(len(commands)))
+    running: dict[int, subprocess.Popen] = {}
+    done: int = 0
+    failed: bool = False
+    while (pending or running) and not failed:
+        while pending and len(running) < jobs:
+            i = pending.pop(0)
+            running[i] = subprocess.Popen(
+                commands[i],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        time.sleep(0.2)
+        for i, process in list(running.items()):
+            if process.poll() is None:
+                continue
+            del running[i]
+            stderr: str = process.stderr.read().decode('utf-8')
+            if stderr:
+                logger.debug(f"Chunk {i} FFmpeg stderr:\n{stderr}")
+            if process.returncode != 0:
+                print(red(f"Error: failed to encode chunk {i}: {stderr.strip()}"))
+                failed = True
+                continue
+            done += 1
+            print(f"  encoded chunks: {done}/{len(commands)}", end='\r')
+
+    if failed:
+        for process in running.values():
+            process.kill()
+            process.wait()
+        return None
+    print()
+    return chunk_fps
+
+
+def write_concat_list(chunk_fps: list[str], list_fp: str) -> None:
+    """Writes the list of files used by the concat demuxer"""
+    with open(list_fp, mode='w', encoding='utf-8') as list_file:
+        for chunk_fp in chunk_fps:
+            escaped_fp: str = chunk_fp.replace("'", "'\\''")
+            list_file.write(f"file '{escaped_fp}'\n")
@@ -0,0 +1,124 @@
+"""Filter graph of py_temporalfix, built from the arguments of the vs script.
+Used by vstf.vpy (vspipe) and by the warm workers (vstf_worker.py).
+This module must be imported by the python interpreter which has vapoursynth
+and the plugins installed (i.e. the vspython environment).
+"""
+from multiprocessing import cpu_count
+import vapoursynth as vs
+
+from vs_temporalfix import CropDetect, DuplicateMap, vs_temporalfix
+from .pxl_fmt import pix_fmt_to_vs_format
+from .source_cache import load_source_cache, save_source_cache
+from .vs_source import load_source
+from .vsscript import report_script_info
+
+
+# Arguments passed by the driver, as strings
+SCRIPT_ARGS: tuple[str] = (
+    'threads',
+    'input_fp',
+    'source_filter',
+    'decoder_threads',
+    'tr',
+    'strength',
+    'tf_preset',
+    'use_mvsf',
+    'me_downscale',
+    'reuse_vectors',
+    'pix_fmt',
+    'exclude',
+    'exclude_fp',
+    'dedup',
+    'autocrop',
+    'static',
+    'color_range',
+)
+
+
+def build_clip(args: dict[str, str]) -> vs.VideoNode:
+    core = vs.core
+    # Nb of threads given by the CPU partitioning of the driver
+    threads: int = int(args['threads'])
+    core.num_threads = threads if threads > 0 else int(cpu_count() - 2)
+    core.max_cache_size = 20000
+
+    source_fp = args['input_fp'].replace("\"", "")
+    # The index is cached and shared by the next runs
+    clip = load_source(source_fp, args['source_filter'], int(args['decoder_threads']))
+    # clip = clip.std.SetFrameProps(_Matrix=vs.MATRIX_BT709)
+    # clip = clip.std.SetFrameProps(_Primaries=vs.MATRIX_BT709)
+    # clip = clip.std.SetFrameProps(_ChromaLocation=vs.MATRIX_BT709)
+    # clip = clip.std.SetFrameProps(_ColorRange=vs.RANGE_FULL)
+
+    # Frames which are not processed: ranges from the command line and/or a file
+    exclude: str = args['exclude']
+    if args['exclude_fp']:
+        with open(args['exclude_fp'], mode='r') as exclude_file:
+            exclude = f"{exclude} {exclude_file.read()}"
+
+    # Process the unique frames only: the duplicate map is detected once per source
+    frame_map = None
+    if int(args['dedup']):
+        frame_map = load_source_cache(source_fp, "duplicates")
+        if frame_map is None or len(frame_map) != clip.num_frames:
+            frame_map = DuplicateMap(clip)
+            save_source_cache(source_fp, "duplicates", frame_map)
+
+    # Black borders which are not filtered: detected once per source
+    crop = None
+    if int(args['autocrop']):
+        crop = load_source_cache(source_fp, "crop")
+        if crop is None:
+            crop = CropDetect(clip)
+            save_source_cache(source_fp, "crop", crop)
+
+    # Color range of the source from the container, otherwise read from the frame props
+    color_range: int | None = {'limited': 0, 'full': 1}.get(args['color_range'], None)
+
+    if clip.format != vs.YUV444P16:
+        clip = core.resize.Lanczos(
+            clip, format=vs.YUV444P16, matrix_in_s="709"
+        )
+    clip = vs_temporalfix(
+        clip,
+        strength=int(args['strength']),
+        tr=int(args['tr']),
+        preset=args['tf_preset'],
+        use_mvsf=bool(int(args['use_mvsf'])),
+        me_downscale=int(args['me_downscale']),
+        reuse_vectors=bool(int(args['reuse_vectors'])),
+        exclude=exclude if exclude.strip() else None,
+        frame_map=frame_map,
+        crop=crop,
+        static=bool(int(args['static'])),
+        color_range=color_range,
+        debug=False
+    )
+
+    # Output the pixel format expected by the encoder: no conversion in FFmpeg
+    color_family, bit_depth, ss_w, ss_h = pix_fmt_to_vs_format(args['pix_fmt'])
+    out_format = core.query_video_format(
+        {'yuv': vs.YUV, 'rgb': vs.RGB, 'gray': vs.GRAY}[color_family],
+        vs.INTEGER, bit_depth, ss_w, ss_h
+    )
+    # The yuvj formats are full range: converted by the script, not by FFmpeg
+    full_range: bool = args['pix_fmt'].startswith('yuvj')
+    if clip.format.id != out_format.id or full_range:
+        clip = core.resize.Bicubic(
+            clip, format=out_format.id, matrix_in_s="709", dither_type="error_diffusion",
+            **({'range_s': "full"} if full_range else {})
+        )
+    if color_family == 'rgb':
+        # FFmpeg planar rgb formats are ordered as g, b, r
+        clip = core.std.ShufflePlanes(clip, planes=[1, 2, 0], colorfamily=vs.RGB)
+
+    # Reported to the driver before the first frame: no separate --info pass
+    report_script_info({
+        'width': clip.width,
+        'height': clip.height,
+        'frames': clip.num_frames,
+        'fps': f"{clip.fps.numerator}/{clip.fps.denominator}",
+        'format': clip.format.name,
+        'color_range': args['color_range'] if color_range is not None else "frame props",
+    })
+    return clip
@@ -0,0 +1,55 @@
+"""Source filters of the vs scripts.
+This module must be imported by the python interpreter which has vapoursynth
+and the plugins installed (i.e. the vspython environment).
+"""
+import os
+import vapoursynth as vs
+
+from .source_cache import get_cache_dir, source_cache_key
+
+
+SOURCE_FILTERS: dict[str, str] = {
+    'bs': "BestSource",
+    'ffms2': "FFMS2",
+    'lsmas': "L-SMASH-Works",
+}
+
+
+def get_index_dir() -> str:
+    return os.path.join(get_cache_dir(), "index")
+
+
+def load_source(
+    fp: str,
+    source_filter: str = 'bs',
+    threads: int = 0,
+) -> vs.VideoNode:
+    """Opens a video file with the selected source filter.
+    The index is stored in the cache directory, keyed by the file fingerprint
+    (path, size, mtime), so that it is shared by the next runs and by other
+    processes which open the same file.
+    threads: nb of decoder threads, 0 lets the source filter decide.
+    """
+    core = vs.core
+    if source_filter not in SOURCE_FILTERS:
+        raise ValueError(f"Unsupported source filter: {source_filter}")
+    if not hasattr(core, source_filter):
+        raise ValueError(f"{SOURCE_FILTERS[source_filter]} ({source_filter}) is not installed")
+
+    index_dir: str = get_index_dir()
+    os.makedirs(index_dir, exist_ok=True)
+    index_fp: str = os.path.join(index_dir, source_cache_key(fp))
+    kwargs: dict[str, int] = {'threads': threads} if threads > 0 else {}
+
+    if source_filter == 'bs':
+        # cachemode 4: always read and write the index at the absolute path cachepath
+        return core.bs.VideoSource(
+            source=fp, cachemode=4, cachepath=index_fp, **kwargs
+        )
+    elif source_filter == 'ffms2':
+        return core.ffms2.Source(
+            source=fp, cachefile=f"{index_fp}.ffindex", **kwargs
+        )
+    return core.lsmas.LWLibavSource(
+        source=fp, cachefile=f"{index_fp}.lwi", **kwargs
+    )
@@ -0,0 +1,153 @@
+"""Pool of warm workers (vstf_worker.py): each one keeps a vs core initialized
+between the jobs, so that a job does not wait for the plugins to load.
+"""
+import json
+import os
+import subprocess
+from typing import IO
+
+from .logger import logger
+
+
+def vs_command_to_args(vs_command: list[str]) -> dict[str, str]:
+    """Returns the arguments of a vspipe command: --arg key=value"""
+    args: dict[str, str] = {}
+    for option, value in zip(vs_command[:-1], vs_command[1:]):
+        if option == "--arg":
+            key, _, value = value.partition("=")
+            args[key] = value
+    return args
+
+
+
+class Worker:
+    """A warm worker: used by the driver as the vspipe process"""
+
+    def __init__(
+        self,
+        command: list[str],
+        env: dict[str, str],
+        cwd: str,
+    ) -> None:
+        self.process: subprocess.Popen = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            cwd=cwd,
+        )
+        os.set_blocking(self.process.stderr.fileno(), False)
+        self.jobs: int = 0
+        # Nb of frames of the current job
+        self.frames: int = 0
+
+    @property
+    def stdout(self) -> IO[bytes]:
+        return self.process.stdout
+
+    @property
+    def stderr(self) -> IO[bytes]:
+        return self.process.stderr
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self) -> None:
+        self.process.kill()
+
+    def wait(self) -> int:
+        return self.process.wait()
+
+
+
+class WorkerPool:
+    """size: nb of workers kept warm.
+    max_jobs: a worker is recycled after this nb of jobs. Its replacement is
+    started with its last job, so that it is initialized when the next job
+    comes.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        env: dict[str, str],
+        cwd: str,
+        size: int = 1,
+        max_jobs: int = 20,
+    ) -> None:
+        self.command: list[str] = command
+        self.env: dict[str, str] = env
+        self.cwd: str = cwd
+        self.size: int = max(size, 1)
+        self.max_jobs: int = max_jobs
+        self.idle: list[Worker] = [self._spawn() for _ in range(self.size)]
+
+
+    def _spawn(self) -> Worker:
+        worker: Worker = Worker(self.command, self.env, self.cwd)
+        logger.debug(f"Worker {worker.process.pid}: started")
+        return worker
+
+
+    def _retire(self, worker: Worker) -> None:
+        if worker.is_alive():
+            try:
+                # End of the jobs: the worker exits
+                worker.process.stdin.close()
+                worker.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                worker.kill()
+                worker.wait()
+        logger.debug(f"Worker {worker.process.pid}: stopped after {worker.jobs} jobs")
+
+
+    def start(self, args: dict[str, str]) -> Worker:
+        """Sends a job to a warm worker. Returns the worker once the graph is
+        built: the frames are then read from its stdout.
+        Raises a RuntimeError if the graph cannot be built.
+        """
+        while True:
+            worker: Worker = self.idle.pop(0) if self.idle else self._spawn()
+            if worker.jobs + 1 >= self.max_jobs:
+                self.idle.append(self._spawn())
+
+            # Wait for the worker to be initialized
+            ready: bytes = worker.stdout.readline()
+            if not ready:
+                # Exited after its previous job (memory limit)
+                self._retire(worker)
+                continue
+            worker.process.stdin.write(json.dumps(args).encode('utf-8') + b"\n")
+            worker.process.stdin.flush()
+            header: bytes = worker.stdout.readline()
+            result: dict = json.loads(header) if header else {'error': "worker exited"}
+            if 'error' in result:
+                worker.frames = 0
+                self.release(worker, relayed=0)
+                raise RuntimeError(result['error'])
+            worker.frames = result['frames']
+            logger.debug(f"Worker {worker.process.pid}: job of {worker.frames} frames")
+            return worker
+
+
+    def release(self, worker: Worker, relayed: int) -> None:
+        """Gives back a worker after a job. It is stopped if all its frames
+        were not read, or recycled after max_jobs to release its memory.
+        """
+        worker.jobs += 1
+        if relayed != worker.frames:
+            worker.kill()
+            worker.wait()
+        if not worker.is_alive() or worker.jobs >= self.max_jobs:
+            self._retire(worker)
+        else:
+            self.idle.insert(0, worker)
+        while len(self.idle) < self.size:
+            self.idle.append(self._spawn())
+
+
+    def close(self) -> None:
+        for worker in self.idle:
+            self._retire(worker)
+        self.idle.clear()
@@ -3,17 +3,265 @@
 # Script by pifroggi https://github.com/pifroggi/vs_temporalfix
 # or tepete on the "Enhance Everything!" Discord Server
 
+import functools
+import math
+import platform
+import sys
 import vapoursynth as vs
 
 core = vs.core
 
 
-def AverageColorFix(clip, ref, radius=4, passes=4):
+# speed/quality presets of the search and detail recovery settings.
+# blksize, overlap and pel are (value for width <= 2400, value for larger widths)
+# colorfix is "box" (AverageColorFix), "pyramid" (AverageColorFix with PyramidBlur) or "fast" (AverageColorFixFast)
+# lowfreq is the low pass of the denoise step: "box" or "pyramid"
+TF_PRESETS = {
+    'draft':    dict(blksize=(16, 32), overlap=(4, 8), pel=(1, 1), search=4, searchparam=1, minblur_radius=1, colorfix="fast",    lowfreq="pyramid"),
+    'fast':     dict(blksize=(8, 16),  overlap=(2, 4), pel=(1, 1), search=4, searchparam=1, minblur_radius=1, colorfix="pyramid", lowfreq="pyramid"),
+    'balanced': dict(blksize=(8, 16),  overlap=(4, 8), pel=(2, 1), search=4, searchparam=1, minblur_radius=2, colorfix="box",     lowfreq="box"),
+    'quality':  dict(blksize=(8, 16),  overlap=(4, 8), pel=(2, 2), search=4, searchparam=2, minblur_radius=2, colorfix="box",     lowfreq="box"),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def CpuOpt():
+    # best value of the opt parameter of the plugins which have one (tcanny, ctmf): 1 = c, 2 = sse2, 3 = avx2, 4 = avx512.
+    # the simd level of the cpu is detected once per process
+    if platform.machine().lower() not in ("x86_64", "amd64", "i386", "i686", "x86"):
+        return 1
+    if sys.platform == "win32":
+        import ctypes
+        present = ctypes.windll.kernel32.IsProcessorFeaturePresent
+        # PF_AVX512F_INSTRUCTIONS_AVAILABLE, PF_AVX2_INSTRUCTIONS_AVAILABLE, PF_XMMI64_INSTRUCTIONS_AVAILABLE
+        for feature, opt in ((41, 4), (40, 3), (10, 2)):
+            if present(feature):
+                return opt
+        return 1
+    try:
+        with open("/proc/cpuinfo", "r") as cpuinfo:
+            flags = next((line.split(":", 1)[1].split() for line in cpuinfo if line.startswith("flags")), [])
+    except OSError:
+        return 1
+    if all(f in flags for f in ("avx512f", "avx512bw", "avx512dq", "avx512vl")):
+        return 4
+    if "avx2" in flags and "fma" in flags:
+        return 3
+    return 2 if "sse2" in flags else 1
+
+
+class NodeCache:
+    # memoises the nodes created through its core attribute, using the function, the source nodes and the
+    # parameters as key: identical requests return the same node instead of adding a new one to the graph.
+    # a single call of vs_temporalfix has no identical requests, the cache is only useful when it is shared by
+    # several calls on the same source clip (e.g. the benchmark cases). the source nodes are part of the key:
+    # they are kept alive by the cache and compared as objects, so a node which is the same filter output
+    # reached through another python object is not recognized
+
+    def __init__(self):
+        self.core  = _CachedCore(self)
+        self.nodes = {}
+        self.stats = {}
+
+    def wrap(self, function):
+        if isinstance(function, vs.Function):
+            name = "{}.{}".format(function.plugin.namespace, function.name)
+        else:
+            name = function.__qualname__
+
+        def cached(*args, **kwargs):
+            key = (name, self._key(args), self._key(kwargs))
+            stats = self.stats.setdefault(name, [0, 0])
+            stats[0] += 1
+            if key in self.nodes:
+                stats[1] += 1
+                return self.nodes[key]
+            node = function(*args, **kwargs)
+            self.nodes[key] = node
+            return node
+        return cached
+
+    def _key(self, value):
+        if isinstance(value, (vs.VideoNode, vs.AudioNode)):
+            return ("node", _Identity(value))
+        if isinstance(value, (list, tuple)):
+            return tuple(self._key(v) for v in value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, self._key(v)) for k, v in value.items()))
+        try:
+            hash(value)
+        except TypeError:
+            return ("object", _Identity(value))
+        return value
+
+    def report(self):
+        requests = sum(r for r, _ in self.stats.values())
+        reused   = sum(r for _, r in self.stats.values())
+        lines    = ["Node cache: {} requests, {} reused".format(requests, reused)]
+        for name, (r, u) in sorted(self.stats.items()):
+            if u:
+                lines.append("  {}: {} requests, {} reused".format(name, r, u))
+        return "\n".join(lines)
+
+
+class _Identity:
+    # key of an object compared by identity: the object is kept alive by the key, so its id cannot be reused
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return id(self.value)
+
+    def __eq__(self, other):
+        return isinstance(other, _Identity) and other.value is self.value
+
+
+class _CachedCore:
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __getattr__(self, name):
+        attr = getattr(vs.core, name)
+        return _CachedPlugin(self._cache, attr) if isinstance(attr, vs.Plugin) else attr
+
+
+class _CachedPlugin:
+    def __init__(self, cache, plugin):
+        self._cache  = cache
+        self._plugin = plugin
+
+    def __getattr__(self, name):
+        attr = getattr(self._plugin, name)
+        return self._cache.wrap(attr) if isinstance(attr, vs.Function) else attr
+
+
+class FusedExpr:
+    # collapses a run of pointwise operations (MakeDiff, MergeDiff, Levels, Invert) on integer clips into a
+    # single std.Expr instead of one node (and one pass over the frame) per operation. the expression repeats
+    # the clamping and rounding of each filter so that the output is identical. with fuse=False, the filters
+    # are chained as before, which is used to check that both outputs are the same.
+    # MaskedMerge is not fused: its 16 bit rounding cannot be reproduced with the 32 bit float math of Expr
+
+    names = "xyzabcdefghijklmnopqrstuvw"
+
+    def __init__(self, clip, planes=None, fuse=True):
+        if clip.format.sample_type != vs.INTEGER:
+            raise TypeError("FusedExpr: only integer formats are supported.")
+        num = clip.format.num_planes
+        bd  = clip.format.bits_per_sample
+        self.planes = list(range(num)) if planes is None else [planes] if isinstance(planes, int) else planes
+        self.fuse   = fuse
+        self.peak   = (1 << bd) - 1
+        self.mid    = 1 << (bd - 1)
+        self.clips  = [clip]  # expression inputs, the first one provides the unprocessed planes
+        self.expr   = "x"
+        self.node   = clip    # unfused chain
+
+    def _operand(self, other):
+        # returns the expression of another clip or FusedExpr, its inputs are added to this one
+        if not isinstance(other, FusedExpr):
+            other = FusedExpr(other, self.planes, self.fuse)
+        tokens = []
+        for token in other.expr.split():
+            if len(token) == 1 and token in self.names:
+                clip = other.clips[self.names.index(token)]
+                index = next((i for i, c in enumerate(self.clips) if c is clip), None)
+                if index is None:
+                    self.clips.append(clip)
+                    index = len(self.clips) - 1
+                token = self.names[index]
+            tokens.append(token)
+        return " ".join(tokens), other.node
+
+    def make_diff(self, other):
+        expr, node = self._operand(other)
+        self.expr = "{} {} - {} + 0 max {} min".format(self.expr, expr, self.mid, self.peak)
+        if not self.fuse:
+            self.node = core.std.MakeDiff(self.node, node, self.planes)
+        return self
+
+    def merge_diff(self, other):
+        expr, node = self._operand(other)
+        self.expr = "{} {} + {} - 0 max {} min".format(self.expr, expr, self.mid, self.peak)
+        if not self.fuse:
+            self.node = core.std.MergeDiff(self.node, node, self.planes)
+        return self
+
+    def levels(self, min_in=0, max_in=None, min_out=0, max_out=None):
+        # gamma = 1 only
+        max_in   = self.peak if max_in  is None else max_in
+        max_out  = self.peak if max_out is None else max_out
+        range_in = max_in - min_in
+        self.expr = "{} {} - 0 max {} min {} / {} * {} + 0.5 + floor".format(self.expr, min_in, range_in, range_in, max_out - min_out, min_out)
+        if not self.fuse:
+            self.node = core.std.Levels(self.node, min_in=min_in, max_in=max_in, min_out=min_out, max_out=max_out, planes=self.planes)
+        return self
+
+    def invert(self):
+        self.expr = "{} {} -".format(self.peak, self.expr)
+        if not self.fuse:
+            self.node = core.std.Invert(self.node, self.planes)
+        return self
+
+    def output(self):
+        if not self.fuse:
+            return self.node
+        if len(self.clips) > len(self.names):
+            raise ValueError("FusedExpr: too many input clips.")
+        return core.std.Expr(self.clips, [self.expr if i in self.planes else "" for i in range(self.clips[0].format.num_planes)])
+
+
+def PyramidBlur(clip, radius, passes, min_radius=1.5):
+    # approximation of std.BoxBlur: the clip is halved as many times as possible while the blur radius on the
+    # smallest level stays above min_radius, blurred on this level, then upscaled back level by level.
+    # the blur radius on the smallest level is chosen so that the variance matches the one of the box blur,
+    # each halving and doubling with bilinear adding 4^(level+1)/6 to the variance
+
+    variance = passes * ((2 * radius + 1) ** 2 - 1) / 12
+
+    def level_radius(levels):
+        level_variance = (variance - 4 * (4 ** levels - 1) / 9) / 4 ** levels
+        return (math.sqrt(12 * max(level_variance, 0) / passes + 1) - 1) / 2
+
+    sub_w = 1 << clip.format.subsampling_w
+    sub_h = 1 << clip.format.subsampling_h
+    sizes = [(clip.width, clip.height)]
+    while level_radius(len(sizes)) >= min_radius:
+        width, height = sizes[-1]
+        width, height = width // 2 // sub_w * sub_w, height // 2 // sub_h * sub_h
+        if width < 16 or height < 16:
+            break
+        sizes.append((width, height))
+    if len(sizes) == 1:
+        return core.std.BoxBlur(clip, hradius=radius, hpasses=passes, vradius=radius, vpasses=passes)
+
+    blurred = clip
+    for width, height in sizes[1:]:
+        blurred = core.resize.Bilinear(blurred, width=width, height=height)
+    level_r = round(level_radius(len(sizes) - 1))
+    if level_r > 0:
+        blurred = core.std.BoxBlur(blurred, hradius=level_r, hpasses=passes, vradius=level_r, vpasses=passes)
+    for width, height in reversed(sizes[:-1]):
+        blurred = core.resize.Bilinear(blurred, width=width, height=height)
+    return blurred
+
+
+def LowPass(clip, radius, passes, pyramid=False):
+    # std.BoxBlur or its pyramid approximation
+    if pyramid:
+        return PyramidBlur(clip, radius, passes)
+    return core.std.BoxBlur(clip, hradius=radius, hpasses=passes, vradius=radius, vpasses=passes)
+
+
+def AverageColorFix(clip, ref, radius=4, passes=4, pyramid=False, fuse=True):
     # modified from https://github.com/pifroggi/vs_colorfix
-    blurred_reference = core.std.BoxBlur(ref, hradius=radius, hpasses=passes, vradius=radius, vpasses=passes)
-    blurred_clip = core.std.BoxBlur(clip, hradius=radius, hpasses=passes, vradius=radius, vpasses=passes)
-    diff_clip = core.std.MakeDiff(blurred_reference, blurred_clip)
-    return core.std.MergeDiff(clip, diff_clip)
+    blurred_reference = LowPass(ref, radius, passes, pyramid)
+    blurred_clip = LowPass(clip, radius, passes, pyramid)
+    diff_clip = FusedExpr(blurred_reference, fuse=fuse).make_diff(blurred_clip)
+    return FusedExpr(clip, fuse=fuse).merge_diff(diff_clip).output()
 
 
 def AverageColorFixFast(clip, ref, downscale_factor=8):
@@ -25,12 +273,12 @@ def AverageColorFixFast(clip, ref, downscale_factor=8):
     return core.std.MergeDiff(clip, diff_clip)
 
 
-def FrequencyMerge(low, high, radius=40, passes=3):
+def FrequencyMerge(low, high, radius=40, passes=3, pyramid=False, fuse=True):
     # merges low freqs of one clip with high freqs of another clip
-    low_remaining  = core.std.BoxBlur(low,  hradius=radius, hpasses=passes, vradius=radius, vpasses=passes)
-    high_removed   = core.std.BoxBlur(high, hradius=radius, hpasses=passes, vradius=radius, vpasses=passes)
-    high_remaining = core.std.MakeDiff(high, high_removed)
-    return core.std.MergeDiff(low_remaining, high_remaining)
+    low_remaining  = LowPass(low,  radius, passes, pyramid)
+    high_removed   = LowPass(high, radius, passes, pyramid)
+    high_remaining = FusedExpr(high, fuse=fuse).make_diff(high_removed)
+    return FusedExpr(low_remaining, fuse=fuse).merge_diff(high_remaining).output()
 
 
 def TweakDarks(src, s0=2.0, c=0.0625, chroma=True):
@@ -51,22 +299,38 @@ def TweakDarks(src, s0=2.0, c=0.0625, chroma=True):
     return core.std.Expr([src], [e] if src.format.num_planes == 1 else [e, expr if chroma else ""])
 
 
+def FlatMask(clip, cache=None, invert=True, opt=None):
+    # mask of the flat areas of the luma plane, i.e. the inverted texture mask.
+    # invert=False returns the texture mask, for callers which fuse the inversion into their own expression
+
+    core = vs.core if cache is None else cache.core
+    opt  = CpuOpt() if opt is None else opt
+    mask = core.std.ShufflePlanes(clip, planes=0, colorfamily=vs.GRAY)
+    mask = core.tcanny.TCanny(mask, op=3, mode=1, sigma=0.1, scale=5.0, t_h=8.0, t_l=1.0, opt=opt) # mask textures
+    mask = core.std.Median(mask, planes=0)
+    return core.std.Invert(mask) if invert else mask # invert for flat areas instead
+
+
 def ExcludeRegions(clip, replacement, exclude=None):
     # simplified ReplaceFrames function from fvsfunc https://github.com/Irrational-Encoding-Wizardry/fvsfunc
     # which is a port of ReplaceFramesSimple by James D. Lin http://avisynth.nl/index.php/RemapFrames
+    # the ranges are sorted and merged, then spliced at once: the graph depth does not grow with the number of
+    # ranges, and the replaced frames of clip are never requested, only their neighbours within the radius
     import re
 
-    if not isinstance(exclude, str):
-        raise TypeError('Exclusions are set like this: exclude="[100 300] [600 900] [2000 2500]", where the first number in the brackets is the start frame and the second is the end frame (inclusive).')
-
-    exclude = exclude.replace(",", " ").replace(":", " ")
-    frames = re.findall(r"\d+(?!\d*\s*\d*\s*\d*\])", exclude)
-    ranges = re.findall(r"\[\s*\d+\s+\d+\s*\]", exclude)
-    maps = []
-    for range_ in ranges:
-        maps.append([int(x) for x in range_.strip("[ ]").split()])
-    for frame in frames:
-        maps.append([int(frame), int(frame)])
+    if isinstance(exclude, str):
+        exclude = exclude.replace(",", " ").replace(":", " ")
+        frames = re.findall(r"\d+(?!\d*\s*\d*\s*\d*\])", exclude)
+        ranges = re.findall(r"\[\s*\d+\s+\d+\s*\]", exclude)
+        maps = []
+        for range_ in ranges:
+            maps.append([int(x) for x in range_.strip("[ ]").split()])
+        for frame in frames:
+            maps.append([int(frame), int(frame)])
+    elif isinstance(exclude, (list, tuple)) and all(isinstance(r, (list, tuple)) and len(r) == 2 for r in exclude):
+        maps = [[int(start), int(end)] for start, end in exclude]
+    else:
+        raise TypeError('Exclusions are set like this: exclude="[100 300] [600 900] [2000 2500]", where the first number in the brackets is the start frame and the second is the end frame (inclusive). A list of [start, end] pairs is also accepted.')
 
     for start, end in maps:
         if start > end:
@@ -74,24 +338,136 @@ def ExcludeRegions(clip, replacement, exclude=None):
         if start >= clip.num_frames:
             raise ValueError("Exclusions start frame {} is outside the clip, which has only {} frames.".format(start, clip.num_frames))
 
-    out = clip
-    for start, end in maps:
-        temp = replacement[start : end + 1]
-        temp = replacement[start : end + 1]
-        if start != 0:
-            temp = out[:start] + temp
-        if end < out.num_frames - 1:
-            temp = temp + out[end + 1 :]
-        out = temp
-    return out
+    # merge overlapping and adjacent ranges
+    merged = []
+    for start, end in sorted(maps):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, min(end, clip.num_frames - 1)])
+
+    pieces = []
+    position = 0
+    for start, end in merged:
+        end = min(end, clip.num_frames - 1)
+        if start > position:
+            pieces.append(clip[position:start])
+        pieces.append(replacement[start : end + 1])
+        position = end + 1
+    if position < clip.num_frames:
+        pieces.append(clip[position:])
+    return pieces[0] if len(pieces) == 1 else core.std.Splice(pieces)
+
+
+def DuplicateMap(clip, threshold=0.0015, width=320):
+    # detects exact and near duplicate frames (animation on 2s/3s, telecine) on a downscaled luma proxy.
+    # returns the index of the unique frame which is used for each frame of the clip. renders the whole clip,
+    # the map is meant to be cached by the caller.
+    # a frame close to the previous one is only a duplicate if it is also close to the first frame of its run:
+    # a slow fade, pan or zoom changes a little per frame but must not be frozen on its first frame
+    height = max(round(clip.height * width / clip.width / 2) * 2, 2)
+    proxy  = core.resize.Bilinear(clip, width=width, height=height, format=vs.GRAY8, matrix_s="709" if clip.format.color_family == vs.RGB else None)
+    stats  = core.std.PlaneStats(proxy, proxy[0] + proxy[:-1]) # mean abs difference with the previous frame
+
+    frame_map = []
+    unique = -1
+    start  = 0
+    for n, frame in enumerate(stats.frames(close=True)):
+        if n > 0 and frame.props['PlaneStatsDiff'] <= threshold and n - 1 != start:
+            # mean abs difference with the first frame of the run
+            frame = core.std.PlaneStats(proxy[n], proxy[start]).get_frame(0)
+        if n == 0 or frame.props['PlaneStatsDiff'] > threshold:
+            unique += 1
+            start = n
+        frame_map.append(unique)
+    return frame_map
+
+
+def Decimate(clip, frame_map):
+    # keeps the first frame of each run of duplicates
+    unique = [n for n in range(len(frame_map)) if n == 0 or frame_map[n] != frame_map[n - 1]]
+    return core.std.SelectEvery(clip, cycle=clip.num_frames, offsets=unique)
+
+
+def Reexpand(clip, frame_map):
+    # back to the original timeline: each duplicate shows its unique frame again
+    return core.std.SelectEvery(clip, cycle=clip.num_frames, offsets=frame_map)
+
+
+def CropDetect(clip, samples=24, threshold=24):
+    # detects the black borders (letterbox/pillarbox) on frames sampled across the clip: a row or column
+    # belongs to a border if its brightest 8 bit luma pixel is below threshold on every sampled frame.
+    # returns (left, right, top, bottom), rounded down to the chroma subsampling
+    luma = core.resize.Point(clip, format=vs.GRAY8, matrix_s="709" if clip.format.color_family == vs.RGB else None)
+    samples = min(samples, clip.num_frames)
+    frames = [clip.num_frames * (2 * i + 1) // (2 * samples) for i in range(samples)]
+    luma = core.std.Splice([luma[n] for n in frames]) if samples > 1 else luma[frames[0]]
+
+    def border(rows, reverse=False):
+        count = 0
+        for row in (reversed(rows) if reverse else rows):
+            if row > threshold:
+                break
+            count += 1
+        return count
+
+    row_max = [0] * clip.height
+    col_max = [0] * clip.width
+    transposed = core.std.Transpose(luma)
+    for frame, frame_t in zip(luma.frames(close=True), transposed.frames(close=True)):
+        data, data_t = bytes(frame[0]), bytes(frame_t[0])
+        for y in range(clip.height):
+            row_max[y] = max(row_max[y], max(data[y * clip.width : (y + 1) * clip.width]))
+        for x in range(clip.width):
+            col_max[x] = max(col_max[x], max(data_t[x * clip.height : (x + 1) * clip.height]))
+
+    sub_w = 1 << clip.format.subsampling_w
+    sub_h = 1 << clip.format.subsampling_h
+    left, right = border(col_max) // sub_w * sub_w, border(col_max, True) // sub_w * sub_w
+    top, bottom = border(row_max) // sub_h * sub_h, border(row_max, True) // sub_h * sub_h
+    if left + right >= clip.width - 64 or top + bottom >= clip.height - 64:
+        # black or nearly black frames only
+        return (0, 0, 0, 0)
+    return (left, right, top, bottom)
+
+
+def RestoreBorders(clip, orig, crop):
+    # pastes the cropped clip back into the borders of the original clip
+    left, right, top, bottom = crop
+    if left or right:
+        strips = [core.std.Crop(orig, right=orig.width - left, top=top, bottom=bottom)] if left else []
+        strips.append(clip)
+        if right:
+            strips.append(core.std.Crop(orig, left=orig.width - right, top=top, bottom=bottom))
+        clip = core.std.StackHorizontal(strips)
+    if top or bottom:
+        strips = [core.std.Crop(orig, bottom=orig.height - top)] if top else []
+        strips.append(clip)
+        if bottom:
+            strips.append(core.std.Crop(orig, top=orig.height - bottom))
+        clip = core.std.StackVertical(strips)
+    return clip
+
+
+def ColorRangeSelect(convert, prop_src, default_range, cache=None):
+    # convert(range) returns the clip for this color range (0 limited, 1 full)
+    # the range is read from the props of each frame: no frame is requested while building the graph
+    core     = vs.core if cache is None else cache.core
+    branches = [convert(0), convert(1)]
 
+    def select(n, f):
+        return branches[1 - f.props.get('_ColorRange', 1 - default_range)] # frame props range is inversed
+    return core.std.FrameEval(branches[default_range], select, prop_src=prop_src)
 
-def DegrainPrefilter(clip, thsad=250, tr=6):
+
+def DegrainPrefilter(clip, thsad=250, tr=6, vectors=None, cache=None):
     # creates a temporally extremely stable reference for better motion vector estimation, but with lots of ghosting
     # based on SpotLess function from G41Fun https://github.com/Vapoursynth-Plugins-Gitify/G41Fun
     # which was modified from lostfunc https://github.com/theChaosCoder/lostfunc/blob/v1/lostfunc.py#L10
     # which was a port of Didée's original avisynth function https://forum.doom9.org/showthread.php?p=1402690
 
+    core = vs.core if cache is None else cache.core
+
     A = core.mv.Analyse
     C = core.mv.Compensate
     S = core.mv.Super
@@ -113,6 +489,11 @@ def DegrainPrefilter(clip, thsad=250, tr=6):
     pel = 1
     sup = S(clip, pel=pel, sharp=1, rfilter=4)
     analyse_args = dict(blksize=bs, overlap=0, search=4, searchparam=1, truemotion=False)
+    if vectors is not None:
+        def A(super, isb, delta, **analyse_args):
+            # keep the coarse vectors so that they can be refined instead of searching them again
+            vectors[(isb, delta)] = core.mv.Analyse(super, isb=isb, delta=delta, **analyse_args)
+            return vectors[(isb, delta)]
 
     # analyze
     if tr > 5:
@@ -148,9 +529,11 @@ def DegrainPrefilter(clip, thsad=250, tr=6):
         return clip.mv.Degrain6(sup, bv1, fv1, bv2, fv2, bv3, fv3, bv4, fv4, bv5, fv5, bv6, fv6, thsad=thsad, plane=0)
 
 
-def LowFreqDenoise(clip, motionmask, thsad=200, tr=6):
+def LowFreqDenoise(clip, motionmask, thsad=200, tr=6, cache=None, pyramid=False, fuse=True):
     # temporally denoise low frequencies only
 
+    core = vs.core if cache is None else cache.core
+
     A = core.mv.Analyse
     C = core.mv.Compensate
     S = core.mv.Super
@@ -204,30 +587,49 @@ def LowFreqDenoise(clip, motionmask, thsad=200, tr=6):
 
     clip_degr = core.std.MaskedMerge(clip_degr, clip_down, motionmask)               # reduce blending/ghosting
     clip_degr = core.resize.Bicubic(clip_degr, width=clip.width, height=clip.height) # resize back to original res
-    return FrequencyMerge(clip_degr, clip, 10, 3)                                    # merge low freqs with original high freqs
+    return FrequencyMerge(clip_degr, clip, 10, 3, pyramid, fuse)                     # merge low freqs with original high freqs
 
 
-def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=False):
+def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, me_downscale=1, reuse_vectors=False, use_mvsf=True, preset="balanced", fuse=True, opt=None, frame_map=None, crop=None, static=False, color_range=None, cache=None, debug=False):
     # based on SMDegrain function from G41Fun https://github.com/Vapoursynth-Plugins-Gitify/G41Fun
     # which is a modification of SMDegrain from havsfunc https://github.com/HomeOfVapourSynthEvolution/havsfunc/blob/r31/havsfunc.py#L3186
     # which is a port of SMDegrain from avisynth https://forum.videohelp.com/threads/369142
 
+    # identical Super/Analyse/... requests share the same node when a NodeCache is shared by several calls
+    core = vs.core if cache is None else cache.core
+
     ##### checks & settings #####
 
     if not isinstance(clip, vs.VideoNode):
         raise TypeError("This is not a vapoursynth clip.")
     if tr < 1:
         raise ValueError("Temporal radius (tr) must be at least 1.")
+    if preset not in TF_PRESETS:
+        raise ValueError("Preset must be one of: {}.".format(", ".join(TF_PRESETS.keys())))
+    if me_downscale not in (1, 2):
+        raise ValueError("Motion estimation downscale factor (me_downscale) must be 1 or 2.")
+    if frame_map is not None and len(frame_map) != clip.num_frames:
+        raise ValueError("The duplicate frame map (frame_map) has {} frames, the clip has {}.".format(len(frame_map), clip.num_frames))
+    if crop is not None and len(crop) != 4:
+        raise ValueError("Borders to crop (crop) must be (left, right, top, bottom).")
+    if color_range is not None and color_range not in (0, 1):
+        raise ValueError("Color range (color_range) must be 0 (limited), 1 (full) or None (from the frame props).")
+    if opt is not None and opt not in (1, 2, 3, 4):
+        raise ValueError("Plugins code path (opt) must be 1 (c), 2 (sse2), 3 (avx2), 4 (avx512) or None (detected).")
+    # tr > 6: mvtools-sf (32 bit float), unless use_mvsf=False requests the 16 bit approximation (DegrainComposite)
+    mvsf = tr > 6 and use_mvsf
+    if reuse_vectors and mvsf:
+        raise ValueError("Refining the prefilter motion vectors (reuse_vectors) is not supported with mvtools-sf (tr > 6 and use_mvsf=True).")
 
     # original properties
-    props       = clip.get_frame(0).props
     orig_format = clip.format.id
     orig_family = clip.format.color_family
-    orig_range  = 1 - props.get('_ColorRange', 0 if orig_family == vs.RGB else 1) # if not tagged, default to full for rgb, limited for yuv/gray (frame props range is inversed)
+    orig_range  = color_range # None: read from the frame props of each frame
+    def_range   = 1 if orig_family == vs.RGB else 0 # if not tagged, default to full for rgb, limited for yuv/gray
     orig_width  = clip.width
 
     # global settings
-    S  = core.mv.Super if tr < 7 else core.mvsf.Super
+    S  = core.mv.Super if not mvsf else core.mvsf.Super
     A  = core.mv.Analyse
     D1 = core.mv.Degrain1
     D2 = core.mv.Degrain2
@@ -236,19 +638,21 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
     D5 = core.mv.Degrain5
     D6 = core.mv.Degrain6
     bd          = 16
-    peak        = (1 << bd) - 1 if tr < 7 else 1.0
+    peak        = (1 << bd) - 1 if not mvsf else 1.0
     limit       = 255
     limit       = limit * peak / 255
     limitc      = limit
     strengthc   = strength // 2
     chroma      = False if clip.format.color_family == vs.GRAY else True
     plane       = 4  if chroma else 0
-    blksize     = 16 if orig_width > 2400 else 8
-    overlap     = 8  if orig_width > 2400 else 4
-    pel         = 1  if orig_width > 2400 else 2
+    settings    = TF_PRESETS[preset]
+    large       = 1 if orig_width > 2400 else 0
+    blksize     = settings['blksize'][large]
+    overlap     = settings['overlap'][large]
+    pel         = max(settings['pel'][large] // me_downscale, 1) # reduced resolution motion search, see below
     subpixel    = 0
-    search      = 4
-    searchparam = 1
+    search      = settings['search']
+    searchparam = settings['searchparam']
     DCT         = 0
     thSCD1      = 1000
     thSCD2      = 1000
@@ -259,18 +663,41 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
     Amp         = 0.2
     if pel < 2:
         subpixel = min(subpixel, 2)
-    if tr > 6:
+    # me_downscale: the prefilter is upscaled by pel for the motion search, me_downscale divides pel so that the
+    # vectors are searched on a smaller (or not upscaled) prefilter. the superclips of the search and of the
+    # degrain use the same pel, so the vectors stay valid at full resolution: only the subpixel precision is lost
+    if reuse_vectors and pel > 1:
+        # the prefilter is searched on the clip upscaled by pel: its vectors do not match the blocks of pref_sup
+        raise ValueError("Refining the prefilter motion vectors (reuse_vectors) requires pel 1: preset fast or draft, balanced for widths > 2400, or me_downscale=2.")
+    if mvsf:
         mvsflegacy = not hasattr(core.mvsf, "Degrain")  # true is plugin version r9 or older, false is r10 pre-release or newer
 
     ##### prepare input clip #####
 
-    # convert to 16 bit
+    # process the unique frames only, the duplicates are restored at the end
     orig = clip
-    if orig_format != vs.YUV444P16 or orig_range != 1:
+    if frame_map is not None:
+        clip = Decimate(clip, frame_map)
+
+    # do not filter the black borders, they are added back at the end
+    if crop is not None and any(crop):
+        left, right, top, bottom = crop
+        clip = core.std.Crop(clip, left=left, right=right, top=top, bottom=bottom)
+
+    # convert to 16 bit
+    range_src = clip
+
+    def to_16bit(range_in, clip=clip):
+        if orig_format == vs.YUV444P16 and range_in == 1:
+            return clip
         if orig_family == vs.RGB:
-            clip = core.resize.Point(clip, format=vs.YUV444P16, range=1, matrix_s="709")
-        else:
-            clip = core.resize.Point(clip, format=vs.YUV444P16, range=1)
+            return core.resize.Point(clip, format=vs.YUV444P16, range_in=range_in, range=1, matrix_s="709")
+        return core.resize.Point(clip, format=vs.YUV444P16, range_in=range_in, range=1)
+
+    if orig_range is not None:
+        clip = to_16bit(orig_range)
+    else:
+        clip = ColorRangeSelect(to_16bit, range_src, def_range, cache)
 
     # add borders
     clip = core.std.AddBorders(clip, left=extra_pad, right=extra_pad, top=extra_pad, bottom=extra_pad)
@@ -316,7 +743,8 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
 
     # prefilter
     pref_ref = pref
-    pref = DegrainPrefilter(pref, strength // 2, tr)       # main prefilter step
+    coarse_vectors = {} if reuse_vectors else None
+    pref = DegrainPrefilter(pref, strength // 2, tr, coarse_vectors, cache) # main prefilter step
     pref = AverageColorFixFast(pref, pref_ref, 32)         # fix low freqs
     pref = core.std.MaskedMerge(pref, pref_ref, mm_resize) # fix blending/ghosting
     pref = TweakDarks(pref, s0=Str, c=Amp, chroma=chroma)  # brighten darks
@@ -324,7 +752,7 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
     ##### degrain #####
 
     # resize and convert if needed
-    if tr < 7:
+    if not mvsf:
         if pel > 1:
             pelclip = pref
             pref    = core.resize.Bicubic(pref, width=clip.width, height=clip.height)
@@ -343,7 +771,20 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
 
     # analyze
     analyse_args = dict(blksize=blksize, search=search, chroma=chroma, truemotion=truemotion, global_=MVglobal, overlap=overlap, dct=DCT, searchparam=searchparam, fields=False)
-    if tr < 7:  # using mvtools because it is faster
+    if reuse_vectors:
+        recalc_args  = dict(blksize=blksize, overlap=overlap, search=search, searchparam=searchparam, chroma=chroma, truemotion=truemotion, dct=DCT, thsad=strength // 2)
+
+        def A(super, isb, delta, **analyse_args):
+            if (isb, delta) in coarse_vectors:
+                # seed with the 128px vectors of the prefilter, one full search per delta only
+                return core.mv.Recalculate(super, coarse_vectors[(isb, delta)], **recalc_args)
+            # the prefilter has no vectors for this delta
+            return core.mv.Analyse(super, isb=isb, delta=delta, **analyse_args)
+
+    if not mvsf:  # using mvtools because it is faster
+        if tr > 6:
+            bvn = [A(pref_sup, isb=True,  delta=delta, **analyse_args) for delta in range(7, tr + 1)]
+            fvn = [A(pref_sup, isb=False, delta=delta, **analyse_args) for delta in range(7, tr + 1)]
         if tr > 5:
             bv6 = A(pref_sup, isb=True,  delta=6, **analyse_args)
             fv6 = A(pref_sup, isb=False, delta=6, **analyse_args)
@@ -369,9 +810,11 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
             vec = core.mvsf.Analyze(pref_sup, radius=tr, **analyse_args)
 
     # degrain
-    if tr < 7:  # using mvtools because it is faster
+    if not mvsf:  # using mvtools because it is faster
         degrain_args = dict(thsad=strength, thsadc=strengthc, plane=plane, limit=limit, limitc=limitc, thscd1=thSCD1, thscd2=thSCD2)
-        if   tr == 6:
+        if   tr > 6:
+            clip = DegrainComposite(clip, clip_sup, [bv1, bv2, bv3, bv4, bv5, bv6] + bvn, [fv1, fv2, fv3, fv4, fv5, fv6] + fvn, cache=cache, **degrain_args)
+        elif tr == 6:
             clip = D6(clip, clip_sup, bv1, fv1, bv2, fv2, bv3, fv3, bv4, fv4, bv5, fv5, bv6, fv6, **degrain_args)
         elif tr == 5:
             clip = D5(clip, clip_sup, bv1, fv1, bv2, fv2, bv3, fv3, bv4, fv4, bv5, fv5, **degrain_args)
@@ -392,19 +835,23 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
             clip = core.mvsf.Degrain(clip, clip_sup, vec, **degrain_args)
         clip = core.resize.Point(clip, format=vs.YUV444P16)
 
+    # zero-motion average on static frames, the detail recovery is the same for both
+    if static:
+        clip = StaticShotSelect(clip, ref, tr, cache=cache)
+
     ##### recover details #####
 
     # colorfix to counter denoising sometimes changing local brightness
-    clip = AverageColorFix(clip, ref, 4, 4)
+    if settings['colorfix'] == "fast":
+        clip = AverageColorFixFast(clip, ref, 8)
+    else:
+        clip = AverageColorFix(clip, ref, 4, 4, pyramid=settings['colorfix'] == "pyramid", fuse=fuse)
 
     # contrasharp to counter slight blur
-    clip = ContraSharpening(clip, ref, rep=24, planes=[0])
+    clip = ContraSharpening(clip, ref, rep=24, planes=[0], minblur_radius=settings['minblur_radius'], fuse=fuse, opt=opt)
 
     # mask to find areas where temporalfix may have removed some texture
-    fm_post = core.std.ShufflePlanes(clip, planes=0, colorfamily=vs.GRAY)
-    fm_post = core.tcanny.TCanny(fm_post, op=3, mode=1, sigma=0.1, scale=5.0, t_h=8.0, t_l=1.0, opt=1) # mask textures post temporalfix
-    fm_post = core.std.Median(fm_post, planes=0)
-    fm_post = core.std.Invert(fm_post) # invert for flat areas instead
+    fm_post = FlatMask(clip, cache, opt=opt) # mask textures post temporalfix
 
     # overlay original on top of flat areas as these areas may have had texture before
     # don't do if denoise as this will bring back light grain in those areas
@@ -412,13 +859,11 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
         clip = core.std.MaskedMerge(clip, ref, fm_post, planes=0)
 
     # mask flat areas with block matching artifacts/wrong motion and overlay original
-    fm_pre  = core.std.ShufflePlanes(ref, planes=0, colorfamily=vs.GRAY)
-    fm_pre  = core.tcanny.TCanny(fm_pre, op=3, mode=1, sigma=0.1, scale=5.0, t_h=8.0, t_l=1.0, opt=1) # mask textures pre temporalfix
-    fm_pre  = core.std.Median(fm_pre, planes=0)
-    fm_pre  = core.std.Invert(fm_pre) # invert for flat areas instead
-    fm_diff = core.std.MakeDiff(fm_post, fm_pre) # compare masks to check if there is now more texture than before, which suggests artifacts
-    fm_diff = core.std.Levels(fm_diff, max_in=32768, max_out=65535) # only use part of mask were textures increased
-    fm_diff = core.std.Invert(fm_diff)
+    # the inversion of fm_pre, the difference, levels and inversion of fm_diff are a single expression
+    fm_pre  = FusedExpr(FlatMask(ref, cache, invert=False, opt=opt), fuse=fuse).invert() # mask textures pre temporalfix
+    fm_diff = FusedExpr(fm_post, fuse=fuse).make_diff(fm_pre) # compare masks to check if there is now more texture than before, which suggests artifacts
+    fm_diff = fm_diff.levels(max_in=32768, max_out=65535) # only use part of mask were textures increased
+    fm_diff = fm_diff.invert().output()
     clip    = core.std.MaskedMerge(clip, ref, fm_diff, planes=0) # use mask to overlay original
 
     # overlay original in areas with large motion to fix blending/ghosting/warping
@@ -429,7 +874,7 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
 
     # denoise low frequencies
     if denoise:
-        clip = LowFreqDenoise(clip, mm, strength // 2, tr)
+        clip = LowFreqDenoise(clip, mm, strength // 2, tr, cache, pyramid=settings['lowfreq'] == "pyramid", fuse=fuse)
 
     ##### finalize output clip #####
 
@@ -437,11 +882,23 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
     clip = core.std.Crop(clip, left=extra_pad, right=extra_pad, top=extra_pad, bottom=extra_pad)
 
     # convert back to original format
-    if orig_format != vs.YUV444P16 or orig_range != 1:
+    def to_orig(range_out, clip=clip):
+        if orig_format == vs.YUV444P16 and range_out == 1:
+            return clip
         if orig_family == vs.RGB:
-            clip = core.resize.Point(clip, format=orig_format, range=orig_range, dither_type="error_diffusion", matrix_in_s="709")
-        else:
-            clip = core.resize.Point(clip, format=orig_format, range=orig_range, dither_type="error_diffusion")
+            return core.resize.Point(clip, format=orig_format, range=range_out, dither_type="error_diffusion", matrix_in_s="709")
+        return core.resize.Point(clip, format=orig_format, range=range_out, dither_type="error_diffusion")
+
+    if orig_range is not None:
+        clip = to_orig(orig_range)
+    else:
+        clip = ColorRangeSelect(to_orig, range_src, def_range, cache)
+
+    # back to the original timeline
+    if frame_map is not None:
+        clip = Reexpand(clip, frame_map)
+    if crop is not None and any(crop):
+        clip = RestoreBorders(clip, orig, crop)
 
     # exclude regions from temporal fixing
     if exclude is not None:
@@ -449,10 +906,68 @@ def vs_temporalfix(clip, strength=400, tr=6, denoise=False, exclude=None, debug=
             orig = core.std.Levels(orig, gamma=2)
         clip = ExcludeRegions(clip, orig, exclude=exclude)
 
+    if debug and cache is not None:
+        print(cache.report(), file=sys.stderr)
+
     # return result
     return clip
 
 
+def DegrainComposite(clip, super, bv, fv, cache=None, **degrain_args):
+    # approximation of a degrain with any temporal radius in integer: mv.Degrain1..6 are applied on groups of up
+    # to 6 vector pairs, their outputs are merged as if all frames had been averaged at once. this is only exact
+    # when all the weights are equal: mv.Degrain weighs each block by its SAD and applies thsad per group, so the
+    # output differs from mvtools-sf. only used when requested (use_mvsf=False).
+    # each degrained clip contains the source frame once, which is removed from the sum.
+
+    core = vs.core if cache is None else cache.core
+    degrain = [None, core.mv.Degrain1, core.mv.Degrain2, core.mv.Degrain3, core.mv.Degrain4, core.mv.Degrain5, core.mv.Degrain6]
+
+    clips, weights = [], []
+    for i in range(0, len(bv), 6):
+        vectors = [v for pair in zip(bv[i : i + 6], fv[i : i + 6]) for v in pair]
+        clips.append(degrain[len(vectors) // 2](clip, super, *vectors, **degrain_args))
+        weights.append(len(vectors) + 1)
+    if len(clips) == 1:
+        return clips[0]
+
+    names = "xyzabcdefghijklmnopqrstuvw"
+    expr  = " ".join("{} {} *".format(names[i], w) for i, w in enumerate(weights))
+    expr += " +" * (len(clips) - 1)
+    expr += " {} {} * - {} /".format(names[len(clips)], len(clips) - 1, 2 * len(bv) + 1)
+    planes = {0: [0], 1: [1], 2: [2], 3: [1, 2], 4: [0, 1, 2]}[degrain_args.get('plane', 4)]
+    return core.std.Expr(clips + [clip], [expr if i in planes else "" for i in range(clip.format.num_planes)])
+
+
+def StaticShotSelect(moving, ref, tr=6, threshold=0.003, cache=None):
+    # frames without any change between consecutive frames over the whole temporal window (locked-off shots,
+    # slides, title cards) are a zero-motion average of ref, the others are taken from moving. the choice is
+    # made per frame in the graph: static frames never request moving, so no motion vectors are searched.
+    # std.AverageFrames is limited to 31 frames
+
+    core = vs.core if cache is None else cache.core
+    tr = min(tr, 15)
+    if ref.num_frames <= 2 * tr:
+        return moving
+    static = core.std.AverageFrames(ref, weights=[1] * (2 * tr + 1))
+
+    # mean abs difference with the previous frame on a downscaled luma proxy
+    proxy = core.resize.Bilinear(ref, width=320, height=max(round(ref.height * 320 / ref.width / 2) * 2, 2), format=vs.GRAY8)
+    stats = core.std.PlaneStats(proxy, proxy[0] + proxy[:-1])
+    window = []
+    for shift in range(-tr + 1, tr + 1):
+        if shift > 0:
+            window.append(stats[shift:] + stats[-1] * shift)
+        elif shift < 0:
+            window.append(stats[0] * -shift + stats[:shift])
+        else:
+            window.append(stats)
+
+    def select(n, f):
+        return static if all(frame.props['PlaneStatsDiff'] < threshold for frame in f) else moving
+    return core.std.FrameEval(moving, select, prop_src=window)
+
+
 # I have consolidated a few functions here to make sure it doesn't break
 
 
@@ -539,7 +1054,7 @@ def DegrainN(clip, super, mvmulti, tr=3, thsad=400.0, plane=4, limit=1.0, thscd1
 # fmt: on
 
 
-def ContraSharpening(clip, src, radius=None, rep=24, planes=[0, 1, 2]):
+def ContraSharpening(clip, src, radius=None, rep=24, planes=[0, 1, 2], minblur_radius=2, fuse=True, opt=None):
     # simplified function from G41Fun https://github.com/Vapoursynth-Plugins-Gitify/G41Fun
     # original avisynth function by Didée at the VERY GRAINY thread https://forum.doom9.org/showthread.php?p=1076491
 
@@ -557,17 +1072,21 @@ def ContraSharpening(clip, src, radius=None, rep=24, planes=[0, 1, 2]):
     num = clip.format.num_planes
     R = core.rgvs.Repair
 
-    s = MinBlur(clip, planes)  # damp down remaining spots of the denoised clip
+    s = MinBlur(clip, planes, minblur_radius, opt)  # damp down remaining spots of the denoised clip
     RG11 = core.std.Convolution(s, matrix=mat1, planes=planes).std.Convolution(matrix=mat2, planes=planes)
     ssD = core.std.MakeDiff(s, RG11, planes)  # the difference of a simple kernel blur
     allD = core.std.MakeDiff(src, clip, planes)  # the difference achieved by the denoising
     ssDD = R(ssD, allD, [rep if i in planes else 0 for i in range(num)])  # limit the difference to the max of what the denoising removed locally
+    if fuse:
+        # limit and apply the difference in a single expression, clamped to the format range as MergeDiff does
+        expr = "y {} - abs z {} - abs < y z ? x + {} -".format(mid, mid, mid)
+        return core.std.Expr([clip, ssDD, ssD], [expr if i in planes else "" for i in range(num)])
     expr = "x {} - abs y {} - abs < x y ?".format(mid, mid)  # abs(diff) after limiting may not be bigger than before
     ssDD = core.std.Expr([ssDD, ssD], [expr if i in planes else "" for i in range(num)])
     return core.std.MergeDiff(clip, ssDD, planes)  # apply the limited difference (sharpening is just inverse blurring)
 
 
-def MinBlur(clip, planes=[0, 1, 2]):
+def MinBlur(clip, planes=[0, 1, 2], radius=2, opt=None):
     # simplified function from G41Fun https://github.com/Vapoursynth-Plugins-Gitify/G41Fun
     # original avisynth function by Didée https://avisynth.nl/index.php/MinBlur
     # Nifty Gauss/Median combination
@@ -579,6 +1098,6 @@ def MinBlur(clip, planes=[0, 1, 2]):
     mat1 = [1, 2, 1, 2, 4, 2, 1, 2, 1]
     mat2 = [1, 1, 1, 1, 1, 1, 1, 1, 1]
     RG11 = core.std.Convolution(clip, matrix=mat1, planes=planes).std.Convolution(matrix=mat2, planes=planes)
-    RG4 = core.ctmf.CTMF(clip, radius=2, planes=planes)
+    RG4 = core.ctmf.CTMF(clip, radius=radius, planes=planes, opt=CpuOpt() if opt is None else opt)
     expr = "x y - x z - * 0 < x dup y - abs x z - abs < y z ? ?"
     return core.std.Expr([clip, RG11, RG4], [expr if i in planes else "" for i in range(clip.format.num_planes)])
@@ -0,0 +1,350 @@
+"""Speed/quality benchmark of the vs_temporalfix options.
+This script must be run with the python interpreter which has vapoursynth
+and the plugins installed (i.e. the vspython environment):
+    python vstf_benchmark.py --input input_video.mkv --suite presets
+"""
+from argparse import (
+    ArgumentParser,
+    Namespace,
+    RawTextHelpFormatter,
+)
+from dataclasses import dataclass
+import math
+import os
+import sys
+import time
+from typing import Callable
+for subd in ("Scripts", "vs-scripts", "vs-plugins", ""):
+    sys.path.insert(0, os.path.abspath(os.path.join("external", "vspython", subd)))
+sys.path.insert(0, os.path.abspath(os.path.join(".")))
+from multiprocessing import cpu_count
+import vapoursynth as vs
+core = vs.core
+
+from utils.p_print import *
+from utils.vs_source import SOURCE_FILTERS, load_source
+from vs_temporalfix import (
+    CpuOpt,
+    DuplicateMap,
+    NodeCache,
+    PyramidBlur,
+    TF_PRESETS,
+    vs_temporalfix,
+)
+
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    # Generates the clip to evaluate from the source clip
+    generate: Callable[[vs.VideoNode], vs.VideoNode]
+    # The quality and speed of the following cases are compared to this one.
+    # The first case of a suite is always a reference
+    reference: bool = False
+
+
+def _vs_temporalfix(
+    arguments: Namespace,
+    clip: vs.VideoNode,
+    **kwargs
+) -> vs.VideoNode:
+    kwargs = {
+        'strength': arguments.strength,
+        'tr': arguments.t_radius,
+        'cache': arguments.cache,
+    } | kwargs
+    return vs_temporalfix(clip, **kwargs)
+
+
+def _me_downscale_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    # Each reduced resolution search is compared to the full pel one of the same preset
+    cases: list[BenchmarkCase] = []
+    for preset in ("balanced", "quality"):
+        for factor in (1, 2):
+            cases.append(BenchmarkCase(
+                f"{preset}, me_downscale={factor}",
+                lambda clip, preset=preset, factor=factor: _vs_temporalfix(
+                    arguments, clip, preset=preset, me_downscale=factor
+                ),
+                reference=factor == 1
+            ))
+    return cases
+
+
+def _reuse_vectors_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    return [
+        BenchmarkCase(
+            f"reuse_vectors={reuse}",
+            lambda clip, reuse=reuse: _vs_temporalfix(
+                arguments, clip, reuse_vectors=reuse, preset="fast"
+            )
+        )
+        for reuse in (False, True)
+    ]
+
+
+def _high_radius_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    # Each 16-bit result is compared to the mvtools-sf one
+    cases: list[BenchmarkCase] = []
+    for tr in range(7, 11):
+        for use_mvsf in (True, False):
+            cases.append(BenchmarkCase(
+                f"tr={tr}, {'mvtools-sf' if use_mvsf else '16-bit'}",
+                lambda clip, tr=tr, use_mvsf=use_mvsf: _vs_temporalfix(
+                    arguments, clip, tr=tr, use_mvsf=use_mvsf
+                ),
+                reference=use_mvsf
+            ))
+    return cases
+
+
+def _presets_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    # From the slowest to the fastest preset
+    return [
+        BenchmarkCase(
+            f"preset={preset}",
+            lambda clip, preset=preset: _vs_temporalfix(
+                arguments, clip, preset=preset
+            )
+        )
+        for preset in reversed(TF_PRESETS.keys())
+    ]
+
+
+def _lowpass_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    # Radius and passes used by FrequencyMerge (default, denoise) and AverageColorFix
+    cases: list[BenchmarkCase] = []
+    for radius, passes in ((40, 3), (10, 3), (4, 4)):
+        cases.extend((
+            BenchmarkCase(
+                f"BoxBlur r={radius}, p={passes}",
+                lambda clip, r=radius, p=passes: core.std.BoxBlur(
+                    clip, hradius=r, hpasses=p, vradius=r, vpasses=p
+                ),
+                reference=True
+            ),
+            BenchmarkCase(
+                f"PyramidBlur r={radius}, p={passes}",
+                lambda clip, r=radius, p=passes: PyramidBlur(clip, r, p)
+            ),
+        ))
+    return cases
+
+
+def _fusion_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    # The fused expressions must give the same output as the chained filters: PSNR is inf
+    cases: list[BenchmarkCase] = []
+    for denoise in (False, True):
+        for fuse in (False, True):
+            cases.append(BenchmarkCase(
+                f"denoise={denoise}, {'fused' if fuse else 'chained'}",
+                lambda clip, denoise=denoise, fuse=fuse: _vs_temporalfix(
+                    arguments, clip, denoise=denoise, fuse=fuse
+                ),
+                reference=not fuse
+            ))
+    return cases
+
+
+def _opt_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    # Code paths of tcanny and ctmf, from c to the best one detected on this cpu
+    return [
+        BenchmarkCase(
+            f"opt={opt}{' (detected)' if opt == CpuOpt() else ''}",
+            lambda clip, opt=opt: _vs_temporalfix(arguments, clip, opt=opt)
+        )
+        for opt in range(1, CpuOpt() + 1)
+    ]
+
+
+def _static_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    return [
+        BenchmarkCase(
+            f"static={static}",
+            lambda clip, static=static: _vs_temporalfix(arguments, clip, static=static)
+        )
+        for static in (False, True)
+    ]
+
+
+def _slow_fade(clip: vs.VideoNode) -> vs.VideoNode:
+    # first frame of the clip, faded to half its level over the clip: each frame differs from the previous one
+    # by less than the DuplicateMap threshold, but not from the first frame
+    still = clip[0] * clip.num_frames
+
+    def fade(n, still=still):
+        return core.std.Expr(still, expr=["x {} *".format(1 - 0.5 * n / still.num_frames), "", ""])
+    return core.std.FrameEval(still, fade)
+
+
+def _dedup_suite(arguments: Namespace) -> list[BenchmarkCase]:
+    # The duplicate map must not freeze a slow fade: the dedup cases are compared to the full processing
+    cases: list[BenchmarkCase] = []
+    for name, prepare in (("source", lambda clip: clip), ("slow fade", _slow_fade)):
+        for dedup in (False, True):
+            cases.append(BenchmarkCase(
+                f"{name}, dedup={dedup}",
+                lambda clip, prepare=prepare, dedup=dedup: _vs_temporalfix(
+                    arguments, prepare(clip),
+                    frame_map=DuplicateMap(prepare(clip)) if dedup else None
+                ),
+                reference=not dedup
+            ))
+    return cases
+
+
+SUITES: dict[str, Callable[[Namespace], list[BenchmarkCase]]] = {
+    'me_downscale': _me_downscale_suite,
+    'reuse_vectors': _reuse_vectors_suite,
+    'high_radius': _high_radius_suite,
+    'presets': _presets_suite,
+    'lowpass': _lowpass_suite,
+    'fusion': _fusion_suite,
+    'opt': _opt_suite,
+    'static': _static_suite,
+    'dedup': _dedup_suite,
+}
+
+
+def load_clip(
+    input_fp: str,
+    start: int,
+    frame_count: int,
+    source_filter: str = 'bs',
+    threads: int = 0,
+) -> vs.VideoNode:
+    clip = load_source(input_fp, source_filter, threads)
+    if clip.format != vs.YUV444P16:
+        clip = core.resize.Lanczos(clip, format=vs.YUV444P16, matrix_in_s="709")
+    return clip[start:start + frame_count]
+
+
+def measure_first_frame(
+    generate: Callable[[vs.VideoNode], vs.VideoNode],
+    clip: vs.VideoNode
+) -> tuple[vs.VideoNode, float]:
+    """Returns the generated clip and the time (s) to build its graph and
+    render its first frame: the startup delay of a run
+    """
+    start_time: float = time.perf_counter()
+    out = generate(clip)
+    out.get_frame(0)
+    return out, time.perf_counter() - start_time
+
+
+def measure_fps(clip: vs.VideoNode) -> float:
+    """Returns the nb of frames per second to render the whole clip"""
+    start_time: float = time.perf_counter()
+    for _ in clip.frames(close=True):
+        pass
+    return clip.num_frames / (time.perf_counter() - start_time)
+
+
+def measure_psnr(clip: vs.VideoNode, ref: vs.VideoNode) -> float:
+    """Returns the average PSNR of the luma plane"""
+    luma = core.std.ShufflePlanes(clip, planes=0, colorfamily=vs.GRAY)
+    luma_ref = core.std.ShufflePlanes(ref, planes=0, colorfamily=vs.GRAY)
+    luma = core.resize.Point(luma, format=vs.GRAYS)
+    luma_ref = core.resize.Point(luma_ref, format=vs.GRAYS)
+    sq_diff = core.std.Expr([luma, luma_ref], expr=["x y - dup *"])
+    sq_diff = core.std.PlaneStats(sq_diff)
+    mse: float = 0
+    for frame in sq_diff.frames(close=True):
+        mse += frame.props['PlaneStatsAverage']
+    mse /= sq_diff.num_frames
+    return 10 * math.log10(1. / mse) if mse > 0 else math.inf
+
+
+def main():
+    parser = ArgumentParser(
+        description="Benchmark of vs_temporalfix",
+        formatter_class=RawTextHelpFormatter
+    )
+    parser.add_argument("-i", "--input", type=str, required=True, help="Input video file.")
+    parser.add_argument("--suite", choices=SUITES.keys(), required=True, help="Benchmark suite.")
+    parser.add_argument(
+        "--source_filter",
+        choices=SOURCE_FILTERS.keys(),
+        default='bs',
+        help="Source filter."
+    )
+    parser.add_argument("--decoder_threads", type=int, default=0, help="Decoder threads, 0: auto.")
+    parser.add_argument("--start", type=int, default=0, help="First frame.")
+    parser.add_argument("--frames", type=int, default=240, help="Nb of frames.")
+    parser.add_argument(
+        "--widths",
+        type=int,
+        nargs='*',
+        default=[],
+        help="Resize the input clip to these widths. Default: no resize."
+    )
+    parser.add_argument("-tr", "--t_radius", type=int, default=6, help="Temporal radius.")
+    parser.add_argument("-s", "--strength", type=int, default=400, help="Strength.")
+    parser.add_argument("--threads", type=int, default=cpu_count() - 2, help="VS threads.")
+    parser.add_argument(
+        "--csv",
+        type=str,
+        default="",
+        help="Append the results to this csv file."
+    )
+    parser.add_argument(
+        "--node_cache",
+        action="store_true",
+        default=False,
+        help="Share the nodes between the cases and report the reused nodes."
+    )
+    arguments: Namespace = parser.parse_args()
+    arguments.cache = None
+
+    core.num_threads = arguments.threads
+    core.max_cache_size = 20000
+
+    src = load_clip(
+        arguments.input,
+        arguments.start,
+        arguments.frames,
+        arguments.source_filter,
+        arguments.decoder_threads
+    )
+    sources: list[vs.VideoNode] = [src]
+    if arguments.widths:
+        sources = [
+            core.resize.Bicubic(
+                src, width=w, height=(src.height * w // src.width) // 2 * 2
+            )
+            for w in arguments.widths
+        ]
+
+    cases: list[BenchmarkCase] = SUITES[arguments.suite](arguments)
+    print(lightcyan(f"Benchmark:"), f"{arguments.suite}, {src.num_frames} frames")
+    print(f"{'size':>11} | {'case':<32} | {'first (s)':>9} | {'fps':>7} | {'speed':>6} | {'PSNR (dB)':>9}")
+    for clip in sources:
+        if arguments.node_cache:
+            arguments.cache = NodeCache()
+        size: str = f"{clip.width}x{clip.height}"
+        ref_fps: float = 0
+        ref_clip: vs.VideoNode | None = None
+        for case in cases:
+            out, first_frame = measure_first_frame(case.generate, clip)
+            fps: float = measure_fps(out)
+            if ref_clip is None or case.reference:
+                ref_clip, ref_fps = out, fps
+                psnr: float = math.inf
+            else:
+                psnr = measure_psnr(out, ref_clip)
+            print(
+                f"{size:>11} | {case.name:<32} | {first_frame:9.3f} | {fps:7.2f} | {fps / ref_fps:5.2f}x | {psnr:9.2f}"
+            )
+            if arguments.csv:
+                with open(arguments.csv, mode='a') as csv_file:
+                    csv_file.write(
+                        f"{arguments.suite};{size};{case.name};{first_frame:.3f};{fps:.2f};{fps / ref_fps:.2f};{psnr:.2f}\n"
+                    )
+            if (clear_cache := getattr(core, "clear_cache", None)) is not None:
+                clear_cache()
+        if arguments.cache is not None:
+            print(arguments.cache.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""NumPy reference implementation of the spatial stages (utils/np_stages.py).
+    python vstf_np_stages.py --mode bench --width 1920 --height 1080
+        micro-benchmark of each stage on random planes: numpy only
+    python vstf_np_stages.py --mode parity --input input_video.mkv
+        compares each stage to the VapourSynth output, and their time per
+        frame. It must be run with the python interpreter which has
+        vapoursynth and the plugins installed (i.e. the vspython environment)
+"""
+from argparse import (
+    ArgumentParser,
+    Namespace,
+    RawTextHelpFormatter,
+)
+from dataclasses import dataclass
+import os
+import sys
+import time
+from typing import Any, Callable
+
+import numpy as np
+
+from utils.p_print import *
+from utils import np_stages as nps
+
+
+@dataclass
+class ParityCase:
+    name: str
+    # Output clip of the VapourSynth stage, from the clip and the reference clip
+    vs_stage: Callable[[Any, Any], Any]
+    # Output plane of the numpy stage, from the luma planes of the clip, of the
+    # reference and of the extra clips
+    np_stage: Callable[..., np.ndarray]
+    # Outputs of the filters which are not implemented in numpy, from the clip
+    # and the reference clip: inputs of the numpy stage
+    extra: Callable[[Any, Any], list[Any]] | None = None
+
+
+def _parity_cases() -> list[ParityCase]:
+    import vapoursynth as vs
+    from vs_temporalfix import (
+        AverageColorFix,
+        ContraSharpening,
+        FrequencyMerge,
+        FusedExpr,
+        MinBlur,
+        TweakDarks,
+    )
+    core = vs.core
+
+    def luma(clip):
+        return core.std.ShufflePlanes(clip, planes=0, colorfamily=vs.GRAY)
+
+    def repaired(clip, ref):
+        # ssDD of ContraSharpening: rgvs.Repair is not implemented in numpy
+        s = MinBlur(clip, [0], 2)
+        rg11 = core.std.Convolution(s, matrix=nps.MAT_RG11, planes=0)
+        rg11 = core.std.Convolution(rg11, matrix=nps.MAT_BOX, planes=0)
+        ssd = core.std.MakeDiff(s, rg11, 0)
+        alld = core.std.MakeDiff(ref, clip, 0)
+        return core.rgvs.Repair(ssd, alld, [24, 0, 0])
+
+    def flat_mask_diff(clip, ref):
+        fm_pre = FusedExpr(luma(ref)).invert()
+        return FusedExpr(luma(clip)).make_diff(fm_pre).levels(max_in=32768, max_out=65535).output()
+
+    def mask_inputs(clip, ref):
+        y, r = luma(clip), luma(ref)
+        return [y, r, core.std.Maximum(y), core.std.Maximum(r), core.std.Median(y), core.std.Median(r)]
+
+    def np_mask_inputs(y, r):
+        return [y, r, nps.maximum(y), nps.maximum(r), nps.median(y), nps.median(r)]
+
+    return [
+        ParityCase(
+            "BoxBlur r=4, p=2",
+            lambda c, r: core.std.BoxBlur(c, hradius=4, hpasses=2, vradius=4, vpasses=2),
+            lambda y, r: nps.box_blur(y, 4, 2),
+        ),
+        ParityCase(
+            "Convolution RG11",
+            lambda c, r: core.std.Convolution(c, matrix=nps.MAT_RG11, planes=0),
+            lambda y, r: nps.convolution(y, nps.MAT_RG11),
+        ),
+        ParityCase("Median", lambda c, r: core.std.Median(c, planes=0), lambda y, r: nps.median(y)),
+        ParityCase("Maximum", lambda c, r: core.std.Maximum(c, planes=0), lambda y, r: nps.maximum(y)),
+        ParityCase(
+            "CTMF r=2",
+            lambda c, r: core.ctmf.CTMF(c, radius=2, planes=0),
+            lambda y, r: nps.ctmf(y, 2),
+        ),
+        ParityCase("TweakDarks", lambda c, r: TweakDarks(c), lambda y, r: nps.tweak_darks(y)),
+        ParityCase(
+            "AverageColorFix r=4, p=4",
+            lambda c, r: AverageColorFix(c, r, 4, 4),
+            lambda y, r: nps.average_color_fix(y, r, 4, 4),
+        ),
+        ParityCase(
+            "FrequencyMerge r=40, p=3",
+            lambda c, r: FrequencyMerge(c, r, 40, 3),
+            lambda y, r: nps.frequency_merge(y, r, 40, 3),
+        ),
+        ParityCase("MinBlur r=2", lambda c, r: MinBlur(c, [0], 2), lambda y, r: nps.min_blur(y, 2)),
+        ParityCase(
+            "ContraSharpening",
+            lambda c, r: ContraSharpening(c, r, planes=[0], minblur_radius=2),
+            lambda y, r, ssdd: nps.contra_sharpening_limit(y, ssdd, nps.contra_sharpening_diff(y, 2)),
+            extra=lambda c, r: [repaired(c, r)],
+        ),
+        ParityCase(
+            "Motion mask expression",
+            lambda c, r: core.std.Expr(mask_inputs(c, r), expr=["x y + z 0.75 * + a 0.5 * + b 0.75 * + c 0.5 * +"]),
+            lambda y, r: nps.motion_mask_fade(*np_mask_inputs(y, r)),
+        ),
+        ParityCase(
+            "Flat mask diff",
+            flat_mask_diff,
+            lambda y, r: nps.flat_mask_diff(y, r),
+        ),
+        ParityCase(
+            "MaskedMerge (flat mask diff)",
+            lambda c, r: core.std.MaskedMerge(c, r, flat_mask_diff(c, r), planes=0),
+            lambda y, r: nps.masked_merge(y, r, nps.flat_mask_diff(y, r)),
+        ),
+    ]
+
+
+def run_parity(arguments: Namespace) -> bool:
+    from vstf_benchmark import load_clip
+
+    clip = load_clip(
+        arguments.input,
+        arguments.start,
+        arguments.frames,
+        arguments.source_filter,
+        arguments.decoder_threads
+    )
+    # Reference: the next frame, as the source is for the denoised clip
+    ref = clip[1:] + clip[-1:]
+
+    print(lightcyan(f"Parity:"), f"{clip.num_frames} frames, {clip.width}x{clip.height}, luma plane")
+    print(f"{'stage':<32} | {'max diff':>8} | {'mismatch':>9} | {'vs ms':>8} | {'np ms':>8}")
+    success: bool = True
+    for case in _parity_cases():
+        out = case.vs_stage(clip, ref)
+        extra = case.extra(clip, ref) if case.extra is not None else []
+        max_diff: int = 0
+        mismatch: int = 0
+        # Time per frame of each stage. The inputs are requested first, so
+        # the vs time is the one of the stage (and of its extra filters),
+        # one frame at a time as the numpy stage
+        vs_elapsed: float = 0.
+        np_elapsed: float = 0.
+        for n in range(clip.num_frames):
+            frames = [c.get_frame(n) for c in (clip, ref, *extra)]
+            planes = [np.asarray(f[0]) for f in frames]
+            start_time: float = time.perf_counter()
+            out_frame = out.get_frame(n)
+            vs_elapsed += time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            np_out = case.np_stage(*planes)
+            np_elapsed += time.perf_counter() - start_time
+            expected = np.asarray(out_frame[0]).astype(np.int64)
+            diff = np.abs(np_out.astype(np.int64) - expected)
+            max_diff = max(max_diff, int(diff.max()))
+            mismatch += int(np.count_nonzero(diff > arguments.tolerance))
+        ratio: float = 100. * mismatch / (clip.num_frames * clip.width * clip.height)
+        vs_ms: float = 1000 * vs_elapsed / clip.num_frames
+        np_ms: float = 1000 * np_elapsed / clip.num_frames
+        result: str = f"{case.name:<32} | {max_diff:8d} | {ratio:8.4f}% | {vs_ms:8.2f} | {np_ms:8.2f}"
+        if arguments.csv:
+            with open(arguments.csv, mode='a') as csv_file:
+                csv_file.write(
+                    f"np_parity;{clip.width}x{clip.height};{case.name};{max_diff};{ratio:.4f};{vs_ms:.2f};{np_ms:.2f}\n"
+                )
+        if max_diff > arguments.tolerance:
+            success = False
+            print(red(result))
+        else:
+            print(result)
+    return success
+
+
+def _bench_stages() -> list[tuple[str, Callable[[np.ndarray, np.ndarray], np.ndarray]]]:
+    return [
+        ("BoxBlur r=4, p=4", lambda y, r: nps.box_blur(y, 4, 4)),
+        ("BoxBlur r=40, p=3", lambda y, r: nps.box_blur(y, 40, 3)),
+        ("Convolution RG11", lambda y, r: nps.convolution(y, nps.MAT_RG11)),
+        ("Median", lambda y, r: nps.median(y)),
+        ("CTMF r=2", lambda y, r: nps.ctmf(y, 2)),
+        ("TweakDarks", lambda y, r: nps.tweak_darks(y)),
+        ("AverageColorFix r=4, p=4", lambda y, r: nps.average_color_fix(y, r, 4, 4)),
+        ("FrequencyMerge r=40, p=3", lambda y, r: nps.frequency_merge(y, r, 40, 3)),
+        ("MinBlur r=2", lambda y, r: nps.min_blur(y, 2)),
+        ("ContraSharpening diff", lambda y, r: nps.contra_sharpening_diff(y, 2)),
+        ("ContraSharpening limit", lambda y, r: nps.contra_sharpening_limit(y, r, y)),
+        ("Flat mask diff", lambda y, r: nps.flat_mask_diff(y, r)),
+        ("MaskedMerge", lambda y, r: nps.masked_merge(y, r, y)),
+    ]
+
+
+def run_bench(arguments: Namespace) -> None:
+    rng = np.random.default_rng(0)
+    shape: tuple[int, int] = (arguments.height, arguments.width)
+    y = rng.integers(0, 1 << 16, size=shape, dtype=np.uint16)
+    r = rng.integers(0, 1 << 16, size=shape, dtype=np.uint16)
+    mpx: float = arguments.width * arguments.height / 1e6
+
+    print(lightcyan(f"Benchmark:"), f"{arguments.width}x{arguments.height}, {arguments.repeat} runs, numpy {np.__version__}")
+    print(f"{'stage':<32} | {'ms':>8} | {'Mpx/s':>8}")
+    for name, stage in _bench_stages():
+        stage(y, r)
+        start_time: float = time.perf_counter()
+        for _ in range(arguments.repeat):
+            stage(y, r)
+        elapsed: float = (time.perf_counter() - start_time) / arguments.repeat
+        print(f"{name:<32} | {1000 * elapsed:8.2f} | {mpx / elapsed:8.1f}")
+        if arguments.csv:
+            with open(arguments.csv, mode='a') as csv_file:
+                csv_file.write(f"np_stages;{arguments.width}x{arguments.height};{name};{1000 * elapsed:.2f}\n")
+
+
+def main():
+    parser = ArgumentParser(
+        description="NumPy reference implementation of the spatial stages",
+        formatter_class=RawTextHelpFormatter
+    )
+    parser.add_argument("--mode", choices=("bench", "parity"), default="bench", help="Benchmark or parity check.")
+    parser.add_argument("-i", "--input", type=str, default="", help="Input video file (parity).")
+    parser.add_argument("--source_filter", type=str, default='bs', help="Source filter (parity).")
+    parser.add_argument("--decoder_threads", type=int, default=0, help="Decoder threads, 0: auto (parity).")
+    parser.add_argument("--start", type=int, default=0, help="First frame (parity).")
+    parser.add_argument("--frames", type=int, default=10, help="Nb of frames (parity).")
+    parser.add_argument(
+        "--tolerance",
+        type=int,
+        default=0,
+        help="Max difference allowed between the numpy and the VapourSynth outputs (parity)."
+    )
+    parser.add_argument("--width", type=int, default=1920, help="Plane width (bench).")
+    parser.add_argument("--height", type=int, default=1080, help="Plane height (bench).")
+    parser.add_argument("--repeat", type=int, default=5, help="Nb of runs of each stage (bench).")
+    parser.add_argument("--csv", type=str, default="", help="Append the results to this csv file.")
+    arguments: Namespace = parser.parse_args()
+
+    if arguments.mode == 'bench':
+        run_bench(arguments)
+        return
+
+    if not arguments.input:
+        sys.exit(red("Error: --input is required by the parity check"))
+    if not os.path.isfile(arguments.input):
+        sys.exit(red(f"Error: missing input file: {arguments.input}"))
+    if not run_parity(arguments):
+        sys.exit(red("Error: the numpy stages differ from the VapourSynth output"))
+    print(green("Parity: ok"))
+
+
+if __name__ == "__main__":
+    main()
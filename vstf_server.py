@@ -0,0 +1,431 @@
+"""Local job server of py_temporalfix.
+Jobs are submitted as JSON over HTTP (localhost) or a Unix socket, queued in
+a SQLite database which survives the restarts of the server, and processed by
+py_temporalfix.py, a few at a time:
+    python vstf_server.py --jobs 2 --watch ./dropbox --watch_output ./fixed
+
+    curl -X POST localhost:8765/jobs -d '{"input": "a.mkv", "args": ["-tr", "8"], "priority": 1}'
+    curl localhost:8765/jobs/1
+    curl -X POST localhost:8765/jobs/1/cancel
+"""
+from argparse import (
+    ArgumentParser,
+    Namespace,
+    RawTextHelpFormatter,
+)
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import re
+import shlex
+import signal
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from typing import Any
+
+from utils.job_queue import JobQueue
+from utils.path_utils import absolute_path, get_app_tempdir, get_extension
+from utils.p_print import *
+
+
+VIDEO_EXTENSIONS: tuple[str] = (
+    '.avi', '.m2ts', '.m4v', '.mkv', '.mov', '.mp4', '.mpg', '.ts', '.webm',
+)
+
+# Lines printed by py_temporalfix.py
+_frame_count_re = re.compile(r"^\s+(\d+) frames")
+_ffmpeg_stats_re = re.compile(r"frame=\s*(\d+)")
+
+
+def kill_process_tree(process: subprocess.Popen) -> None:
+    """Kills py_temporalfix.py and its children: vspipe and the encoders"""
+    if sys.platform == "win32":
+        subprocess.run(
+            ["taskkill", "/T", "/F", "/PID", str(process.pid)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return
+    # The job is the leader of its own process group
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+    except ProcessLookupError:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+
+class JobRunner:
+    def __init__(
+        self,
+        queue: JobQueue,
+        jobs: int,
+        log_dir: str,
+    ) -> None:
+        self.queue: JobQueue = queue
+        self.jobs: int = jobs
+        self.log_dir: str = log_dir
+        self.processes: dict[int, subprocess.Popen] = {}
+        self.stopping: bool = False
+        self._lock = threading.Lock()
+        self._script: str = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "py_temporalfix.py"
+        )
+        os.makedirs(log_dir, exist_ok=True)
+
+
+    def schedule(self) -> None:
+        """Starts the queued jobs, higher priority first, up to the
+        maximum nb of concurrent jobs
+        """
+        while not self.stopping:
+            with self._lock:
+                running: int = len(self.processes)
+            if running < self.jobs and (job := self.queue.next_queued()) is not None:
+                with self._lock:
+                    # Reserve the slot before the process is started
+                    self.processes[job['id']] = None
+                threading.Thread(target=self.run, args=(job,), daemon=True).start()
+                continue
+            time.sleep(0.5)
+
+
+    def run(self, job: dict[str, Any]) -> None:
+        job_id: int = job['id']
+        command: list[str] = [sys.executable, self._script, "--input", job['input']]
+        if job['output']:
+            command.extend(["--output", job['output']])
+        command.extend(job['args'])
+
+        log_fp: str = os.path.join(self.log_dir, f"job_{job_id}.log")
+        print(lightcyan(f"Job {job_id}:"), ' '.join(command))
+        try:
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=sys.platform != "win32",
+                creationflags=(
+                    subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0
+                ),
+            )
+        except Exception as e:
+            self.queue.finish(job_id, 'failed', message=f"Failed to start: {type(e).__name__}")
+            with self._lock:
+                del self.processes[job_id]
+            return
+        with self._lock:
+            self.processes[job_id] = process
+        if (job := self.queue.get(job_id)) is not None and job['status'] == 'canceled':
+            # Canceled while starting
+            kill_process_tree(process)
+
+        # Progress: nb of frames encoded by FFmpeg
+        frame_count: int = 0
+        last_update: float = 0.
+        buffer: str = ""
+        with open(log_fp, mode='w', encoding='utf-8') as log_file:
+            for chunk in iter(lambda: process.stdout.read1(4096), b''):
+                buffer += chunk.decode('utf-8', errors='replace')
+                *lines, buffer = re.split(r"[\r\n]", buffer)
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    log_file.write(f"{line}\n")
+                    if (match := _frame_count_re.match(line)):
+                        frame_count = int(match.group(1))
+                        self.queue.update(job_id, frame_count=frame_count)
+                    elif (match := _ffmpeg_stats_re.search(line)) and frame_count:
+                        frame: int = int(match.group(1))
+                        if time.time() - last_update > 1:
+                            last_update = time.time()
+                            self.queue.update(
+                                job_id, frame=frame, progress=min(frame / frame_count, 1.)
+                            )
+                log_file.flush()
+        returncode: int = process.wait()
+
+        with self._lock:
+            del self.processes[job_id]
+        if self.stopping:
+            # Started again when the server restarts
+            return
+        # py_temporalfix.py does not always exit with an error code
+        with open(log_fp, mode='r', encoding='utf-8') as log_file:
+            failed: bool = returncode != 0 or "Done." not in log_file.read()
+        if failed:
+            self.queue.finish(job_id, 'failed', returncode, message=f"see {log_fp}")
+        else:
+            self.queue.update(job_id, progress=1.)
+            self.queue.finish(job_id, 'done', returncode)
+        print(lightcyan(f"Job {job_id}:"), "failed" if failed else "done")
+
+
+    def cancel(self, job_id: int) -> str | None:
+        """Cancels a job, kills its processes if it is running"""
+        status: str | None = self.queue.cancel(job_id)
+        with self._lock:
+            process: subprocess.Popen | None = self.processes.get(job_id, None)
+        if status == 'running' and process is not None:
+            kill_process_tree(process)
+            print(lightcyan(f"Job {job_id}:"), "canceled")
+        return status
+
+
+    def stop(self) -> None:
+        """Kills the running jobs: they are started again by the next server"""
+        self.stopping = True
+        with self._lock:
+            processes = [p for p in self.processes.values() if p is not None]
+        for process in processes:
+            kill_process_tree(process)
+
+
+
+def watch_folder(
+    runner: JobRunner,
+    directory: str,
+    output_dir: str,
+    args: list[str],
+    interval: float,
+) -> None:
+    """Submits the new video files of a drop folder, once their size has not
+    changed since the previous poll (i.e. the copy is complete)
+    """
+    previous: dict[str, tuple[int, int]] = {}
+    while not runner.stopping:
+        current: dict[str, tuple[int, int]] = {}
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.is_file() or get_extension(entry.name) not in VIDEO_EXTENSIONS:
+                continue
+            stat = entry.stat()
+            current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            if (
+                previous.get(entry.path, None) == current[entry.path]
+                and not runner.queue.is_watched(entry.path, *current[entry.path])
+            ):
+                output: str = os.path.join(output_dir, entry.name)
+                job_id: int = runner.queue.submit(entry.path, output, args)
+                print(lightcyan(f"Job {job_id}:"), f"submitted from the drop folder: {entry.path}")
+        previous = current
+        time.sleep(interval)
+
+
+
+def create_handler(runner: JobRunner) -> type[BaseHTTPRequestHandler]:
+    queue: JobQueue = runner.queue
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def address_string(self) -> str:
+            # No client address on a Unix socket
+            return self.client_address[0] if self.client_address else "unix"
+
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+
+        def _send(self, code: int, data: Any) -> None:
+            body: bytes = json.dumps(data, indent=2).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+        def _job_id(self) -> int | None:
+            if (match := re.match(r"^/jobs/(\d+)(/cancel)?/?$", self.path)):
+                return int(match.group(1))
+            return None
+
+
+        def do_GET(self) -> None:
+            path, _, query = self.path.partition('?')
+            if path == "/status":
+                self._send(200, {
+                    'jobs': queue.counts(),
+                    'running': sorted(runner.processes.keys()),
+                    'concurrency': runner.jobs,
+                })
+            elif path.rstrip('/') == "/jobs":
+                status: str | None = None
+                if (match := re.search(r"status=(\w+)", query)):
+                    status = match.group(1)
+                self._send(200, queue.list(status))
+            elif (job_id := self._job_id()) is not None:
+                job = queue.get(job_id)
+                if job is not None:
+                    self._send(200, job)
+                else:
+                    self._send(404, {'error': "no such job"})
+            else:
+                self._send(404, {'error': "unknown endpoint"})
+
+
+        def do_POST(self) -> None:
+            if self.path.rstrip('/') == "/jobs":
+                try:
+                    length: int = int(self.headers.get("Content-Length", 0))
+                    spec: dict[str, Any] = json.loads(self.rfile.read(length))
+                    input_fp: str = absolute_path(spec['input'])
+                    output_fp: str = absolute_path(spec.get('output', ""))
+                    args: list[str] = spec.get('args', [])
+                    priority: int = int(spec.get('priority', 0))
+                    if isinstance(args, str):
+                        args = shlex.split(args)
+                    if not all(isinstance(arg, str) for arg in args):
+                        raise ValueError("args must be a list of strings")
+                except (KeyError, TypeError, ValueError) as e:
+                    self._send(400, {'error': f"invalid job: {e}"})
+                    return
+                if not os.path.isfile(input_fp):
+                    self._send(400, {'error': f"missing input file {input_fp}"})
+                    return
+                job_id: int = queue.submit(input_fp, output_fp, args, priority)
+                print(lightcyan(f"Job {job_id}:"), f"submitted: {input_fp}")
+                self._send(201, queue.get(job_id))
+
+            elif self.path.rstrip('/').endswith("/cancel") and (job_id := self._job_id()) is not None:
+                self._cancel(job_id)
+            else:
+                self._send(404, {'error': "unknown endpoint"})
+
+
+        def do_DELETE(self) -> None:
+            if (job_id := self._job_id()) is not None:
+                self._cancel(job_id)
+            else:
+                self._send(404, {'error': "unknown endpoint"})
+
+
+        def _cancel(self, job_id: int) -> None:
+            status: str | None = runner.cancel(job_id)
+            if status is None:
+                self._send(404, {'error': "no such job"})
+            elif status not in ('queued', 'running'):
+                self._send(409, {'error': f"job is {status}"})
+            else:
+                self._send(200, queue.get(job_id))
+
+    return JobRequestHandler
+
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+
+def main():
+    parser = ArgumentParser(
+        description="Local job server of py_temporalfix",
+        formatter_class=RawTextHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=8765, help="HTTP port, localhost only.")
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default="",
+        help="Listen on this Unix socket instead of the HTTP port (linux)."
+    )
+    parser.add_argument(
+        "--db",
+        type=str,
+        default=os.path.join(get_app_tempdir(), "server", "jobs.sqlite"),
+        help="SQLite database of the queue."
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="Nb of concurrent jobs.")
+    parser.add_argument("--watch", type=str, default="", help="Drop folder: its new video files are submitted.")
+    parser.add_argument(
+        "--watch_output",
+        type=str,
+        default="",
+        help="Output directory of the jobs of the drop folder, must differ from the drop folder.\nDefault: the 'fixed' subfolder of the drop folder."
+    )
+    parser.add_argument(
+        "--watch_args",
+        type=str,
+        default="",
+        help="py_temporalfix.py arguments of the jobs of the drop folder, e.g. \"-tr 8 --static\"."
+    )
+    parser.add_argument("--watch_interval", type=float, default=5, help="Drop folder polling interval (s).")
+    arguments: Namespace = parser.parse_args()
+
+    db_fp: str = absolute_path(arguments.db)
+    queue: JobQueue = JobQueue(db_fp)
+    runner: JobRunner = JobRunner(
+        queue=queue,
+        jobs=max(arguments.jobs, 1),
+        log_dir=os.path.join(os.path.dirname(db_fp), "logs"),
+    )
+
+    if arguments.socket:
+        if not hasattr(socketserver, "UnixStreamServer"):
+            sys.exit(red(f"Error: Unix sockets are not supported on {sys.platform}"))
+        socket_fp: str = absolute_path(arguments.socket)
+        if os.path.exists(socket_fp):
+            os.remove(socket_fp)
+        server = ThreadingUnixHTTPServer(socket_fp, create_handler(runner))
+        address: str = socket_fp
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", arguments.port), create_handler(runner))
+        address = f"http://127.0.0.1:{arguments.port}"
+
+    threading.Thread(target=runner.schedule, daemon=True).start()
+    if arguments.watch:
+        watch_dir: str = absolute_path(arguments.watch)
+        # The outputs must not be written to the drop folder: they would be submitted again
+        watch_output_dir: str = (
+            absolute_path(arguments.watch_output)
+            if arguments.watch_output
+            else os.path.join(watch_dir, "fixed")
+        )
+        if os.path.normcase(os.path.realpath(watch_output_dir)) == os.path.normcase(os.path.realpath(watch_dir)):
+            sys.exit(red("Error: --watch_output must differ from the drop folder (--watch)"))
+        os.makedirs(watch_dir, exist_ok=True)
+        os.makedirs(watch_output_dir, exist_ok=True)
+        threading.Thread(
+            target=watch_folder,
+            kwargs={
+                'runner': runner,
+                'directory': watch_dir,
+                'output_dir': watch_output_dir,
+                'args': shlex.split(arguments.watch_args),
+                'interval': arguments.watch_interval,
+            },
+            daemon=True
+        ).start()
+        print(lightcyan("Drop folder:"), watch_dir, "->", watch_output_dir)
+
+    print(lightcyan("Queue:"), db_fp, queue.counts())
+    print(lightcyan("Listening on:"), address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop()
+        server.server_close()
+        if arguments.socket and os.path.exists(address):
+            os.remove(address)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Warm worker of py_temporalfix.
+Keeps a vs core initialized (plugins loaded, vs_temporalfix imported) and
+processes jobs sent by the driver (utils/worker_pool.py), one at a time.
+This script must be run with the python interpreter which has vapoursynth
+and the plugins installed (i.e. the vspython environment).
+
+Protocol, one JSON object per line:
+    worker -> driver: {"ready": true, "jobs": <nb of processed jobs>}
+    driver -> worker: {"input_fp": ..., "tr": ..., ...}, the vs script arguments
+    worker -> driver: {"frames": <nb of frames>} or {"error": <message>}
+    worker -> driver: the raw frames, same layout as vspipe
+The worker exits when stdin is closed or when its memory exceeds --max_memory
+after a job.
+"""
+from argparse import ArgumentParser, Namespace
+import gc
+import json
+import os
+import sys
+for subd in ("Scripts", "vs-scripts", "vs-plugins", ""):
+    sys.path.insert(0, os.path.abspath(os.path.join("external", "vspython", subd)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import vapoursynth as vs
+core = vs.core
+
+from utils.vs_graph import build_clip
+
+
+def memory_usage() -> int:
+    """Returns the resident memory (MB) of this process, 0 if unknown"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss // (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", mode='r') as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def clear_core() -> None:
+    """Releases the nodes and the frames of the previous job"""
+    vs.clear_outputs()
+    if (clear_cache := getattr(core, "clear_cache", None)) is not None:
+        clear_cache()
+    gc.collect()
+
+
+def main():
+    parser = ArgumentParser(description="Warm worker of py_temporalfix")
+    parser.add_argument(
+        "--max_memory",
+        type=int,
+        default=0,
+        help="Exit after a job when the memory (MB) exceeds this value. 0: no limit."
+    )
+    arguments: Namespace = parser.parse_args()
+
+    # The frames are written to stdout: the messages go to stderr
+    out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    # Load the plugins now rather than at the first job
+    core.plugins()
+
+    jobs: int = 0
+    while True:
+        out.write(json.dumps({'ready': True, 'jobs': jobs}).encode('utf-8') + b"\n")
+        out.flush()
+        line: bytes = sys.stdin.buffer.readline()
+        if not line:
+            break
+
+        try:
+            clip = build_clip(json.loads(line))
+        except Exception as e:
+            out.write(json.dumps({'error': f"{type(e).__name__}: {e}"}).encode('utf-8') + b"\n")
+            out.flush()
+            clear_core()
+            continue
+
+        out.write(json.dumps({'frames': clip.num_frames}).encode('utf-8') + b"\n")
+        out.flush()
+        try:
+            clip.output(out)
+            out.flush()
+        except (BrokenPipeError, OSError):
+            break
+        jobs += 1
+
+        del clip
+        clear_core()
+        if arguments.max_memory and memory_usage() > arguments.max_memory:
+            break
+
+
+if __name__ == "__main__":
+    main()